@@ -40,6 +40,10 @@ class PosteriorVisualizationCLI(CLIModule):
         parser.add_argument('--is-fixed-clustering', dest='fixed_clustering',
                             action="store_true",
                             help='If flag is set, plot the posterior with fixed clustering options.')
+        parser.add_argument('--n-cpus', type=int, dest='n_cpus',
+                            required=False, default=1,
+                            help='Number of processes to use when rendering the growth and ' \
+                                 'self-interaction parameters of each taxon.')
 
     def main(self, args: argparse.Namespace):
         mcmc = md2.BaseMCMC.load(args.chain)
@@ -59,7 +63,8 @@ class PosteriorVisualizationCLI(CLIModule):
         growthpath = os.path.join(basepath, 'growth')
         os.makedirs(growthpath, exist_ok=True)
         dfvalues = mcmc.graph[STRNAMES.GROWTH_VALUE].visualize(basepath=growthpath,
-                                                               taxa_formatter='%(paperformat)s', section=section)
+                                                               taxa_formatter='%(paperformat)s', section=section,
+                                                               n_cpus=args.n_cpus)
         dfmean = mcmc.graph[STRNAMES.PRIOR_MEAN_GROWTH].visualize(
             path=os.path.join(growthpath, 'mean.pdf'), section=section)
         dfvar = mcmc.graph[STRNAMES.PRIOR_VAR_GROWTH].visualize(
@@ -75,7 +80,8 @@ class PosteriorVisualizationCLI(CLIModule):
         os.makedirs(sipath, exist_ok=True)
         dfvalues = mcmc.graph[STRNAMES.SELF_INTERACTION_VALUE].visualize(basepath=sipath,
                                                                          taxa_formatter='%(paperformat)s',
-                                                                         section=section)
+                                                                         section=section,
+                                                                         n_cpus=args.n_cpus)
         dfmean = mcmc.graph[STRNAMES.PRIOR_MEAN_SELF_INTERACTIONS].visualize(
             path=os.path.join(sipath, 'mean.pdf'), section=section)
         dfvar = mcmc.graph[STRNAMES.PRIOR_VAR_SELF_INTERACTIONS].visualize(
@@ -663,11 +663,13 @@ class Data(DataNode):
         -------
         np.ndarray
         '''
-        y = self.lhs.vector
         valid_indices = None
         if index_out_perturbations and self.G.perturbations is not None:
             valid_indices = self._get_non_pert_rows_of_regress_matrices()
-            y = y[valid_indices]
+            y = self.lhs.vector[valid_indices]
+        else:
+            # Copy so that we can subtract in place without changing `self.lhs`
+            y = np.array(self.lhs.vector, dtype=float)
         for x in keys:
             if x in kwargs_dict:
                 kwargs = kwargs_dict[x]
@@ -682,7 +684,7 @@ class Data(DataNode):
             if valid_indices is not None:
                 b = b[valid_indices]
             try:
-                y = y - b
+                np.subtract(y, b, out=y)
             except:
                 logger.critical('Crash in `construct_lhs` subtracting the matrix.' \
                     ' Key: {}, y.shape: {}, b.shape: {}'.format(x, y.shape, b.shape))
@@ -714,7 +716,7 @@ class Data(DataNode):
 
         Returns
         -------
-        scipy.sparse.csc_matrix or np.ndarray
+        scipy.sparse.csr_matrix or np.ndarray
         '''
         v = []
         valid_indices = None
@@ -736,7 +738,9 @@ class Data(DataNode):
             X =  v[0]
         else:
             try:
-                X = scipy.sparse.hstack(v)
+                # Stack directly into CSR so the products downstream do not each
+                # convert the matrix from COO
+                X = scipy.sparse.hstack(v, format='csr')
             except:
                 # try:
                 #     X = torch.cat(v, 1)
@@ -1003,6 +1007,9 @@ class GrowthDesignMatrix(DesignMatrix):
         self.master_cols = np.kron(
                 np.ones(total_n_dts, dtype=int),
                 np.arange(self.G.data.n_taxa,dtype=int))
+        # Set when the perturbation values or their cluster/indicator layout change,
+        # cleared when `matrix_with_perturbations` is rebuilt
+        self.perturbations_dirty = True
         logger.info('Initializing growth design matrix')
 
     def build(self):
@@ -1059,6 +1066,7 @@ class GrowthDesignMatrix(DesignMatrix):
         self.cols = self.master_cols
         self.rows = self.master_rows
 
+        self.perturbations_dirty = False
         if self.G.perturbations is None:
             self.matrix_with_perturbations = None
             return
@@ -1322,6 +1330,10 @@ class PerturbationMixingDesignMatrix(DesignMatrix):
         only_cids : list, None
             If specified, it will only build for the cids specified.
         '''
+        # The growth matrix with perturbations depends on the same layout
+        growth_dm = self.G.data.design_matrices.get(STRNAMES.GROWTH_VALUE, None)
+        if growth_dm is not None:
+            growth_dm.perturbations_dirty = True
         if only_cids is not None:
             oc = set(list(only_cids))
         else:
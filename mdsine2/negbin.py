@@ -298,7 +298,7 @@ class NegBinDispersionParam(pl.variables.Uniform):
         
 
         r = (new_loglik + jump_to_old) - (old_loglik + jump_to_new)
-        u = np.log(pl.random.misc.fast_sample_standard_uniform())
+        u = -pl.random.misc.fast_sample_standard_exponential()
         if r > u:
             self.acceptances[self.sample_iter] = True
             self.temp_acceptances += 1
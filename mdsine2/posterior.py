@@ -5,6 +5,7 @@ import time
 import itertools
 import psutil
 import os
+import multiprocessing
 import pandas as pd
 
 import numpy as np
@@ -13,6 +14,8 @@ import scipy.sparse
 import numpy.random as npr
 import scipy.stats
 import scipy.sparse
+import scipy.linalg
+import scipy.linalg.blas
 import scipy
 import math
 import random
@@ -24,11 +27,11 @@ from . import pylab as pl
 from .pylab import Graph, Variable, variables
 from .util import generate_cluster_assignments_posthoc, generate_taxonomic_distribution_over_clusters_posthoc
 
-from . import visualization
-import matplotlib.pyplot as plt
-import seaborn as sns
 _LOG_INV_SQRT_2PI = np.log(1/np.sqrt(2*math.pi))
 
+# Minimum number of jointly sampled coefficients to use the conjugate gradient sampler
+_CG_SAMPLER_MIN_DIM = 500
+
 # Helper functions
 #-----------------
 def _normal_logpdf(value: float, loc: float, scale: float) -> float:
@@ -267,6 +270,30 @@ def sample_categorical_log(log_p: Iterator[float]) -> int:
             log_p))
         raise
 
+def sample_bernoulli_logit(logit: float) -> bool:
+    '''Generate one sample from a Bernoulli distribution with the probability
+    of success given by `sigmoid(logit)`.
+
+    This is the same as `bool(sample_categorical_log([0, logit]))` and uses the
+    same random draw, without the log-sum-exp over the general categorical.
+
+    Parameters
+    ----------
+    logit : float
+        Log odds of success
+
+    Returns
+    -------
+    bool
+    '''
+    # Probability of failure, computed so that `exp` cannot overflow
+    if logit >= 0:
+        e = math.exp(-logit)
+        p_off = e / (1. + e)
+    else:
+        p_off = 1. / (1. + math.exp(logit))
+    return random.random() > p_off
+
 def log_det(M: np.ndarray, var: Variable) -> float:
     '''Computes pl.math.log_det but also saves the array if it crashes
 
@@ -345,6 +372,740 @@ def pinv(M: np.ndarray, var: Variable) -> np.ndarray:
         np.save(filename, M)
         raise
 
+def _dense_block(M: Union[scipy.sparse.spmatrix, np.ndarray], rows: np.ndarray,
+    cols: np.ndarray=None, order: str='C') -> np.ndarray:
+    '''Dense copy of `M[rows, :][:, cols]`. If `M` is sparse (preferably CSR) it is
+    sliced before it gets densified so that only the block is ever dense.
+
+    Parameters
+    ----------
+    M : scipy.sparse, np.ndarray
+        Matrix to index
+    rows : np.ndarray
+        Row indices
+    cols : np.ndarray, None
+        Column indices. If None, take all of the columns
+    order : str
+        Memory layout of the returned array
+
+    Returns
+    -------
+    np.ndarray
+    '''
+    if scipy.sparse.issparse(M):
+        M = M[rows, :]
+        if cols is not None:
+            M = M[:, cols]
+        return M.toarray(order=order)
+    if cols is None:
+        return np.array(M[rows, :], order=order)
+    return np.array(pl.util.fast_index(M=M, rows=rows, cols=cols), order=order)
+
+def _marginal_logdet_and_quadratic(prec: np.ndarray, rhs: np.ndarray,
+    var: Variable) -> Tuple[float, float]:
+    '''Computes the terms of the marginal likelihood that depend on the posterior
+    precision `prec` and `rhs = X.T @ process_prec @ y + prior_prec @ prior_mean`:
+    the log determinant of the posterior covariance and `mean.T @ prec @ mean`,
+    where `mean = prec^{-1} @ rhs`.
+
+    Both are read off of the Cholesky factor `prec = L @ L.T`:
+
+        log|prec^{-1}| = -2 * sum(log(diag(L)))
+        mean.T @ prec @ mean = rhs.T @ mean
+
+    If the precision is not positive definite we fall back to `pinv` and `log_det`.
+
+    Parameters
+    ----------
+    prec : np.ndarray
+        Posterior precision matrix. This gets overwritten
+    rhs : np.ndarray
+        Right hand side of the normal equations
+    var : pl.variable.Variable subclass
+        This is the variable that this was called from
+
+    Returns
+    -------
+    float, float
+        Log determinant of the covariance, `mean.T @ prec @ mean`
+    '''
+    rhs = np.ravel(rhs)
+    if rhs.size == 0:
+        return 0., 0.
+    try:
+        L, lower = scipy.linalg.cho_factor(prec, lower=True, overwrite_a=True,
+            check_finite=False)
+    except np.linalg.LinAlgError:
+        cov = pinv(prec, var)
+        mean = cov @ rhs
+        return log_det(cov, var), rhs @ mean
+    mean = scipy.linalg.cho_solve((L, lower), rhs, check_finite=False)
+    return -2. * np.sum(np.log(np.diag(L))), rhs @ mean
+
+def _marginal_logdet_and_quadratic_on_off(prec: np.ndarray, rhs: np.ndarray,
+    var: Variable) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+    '''Computes the terms of `_marginal_logdet_and_quadratic` both with and without
+    the last variable of the system.
+
+    The Cholesky factor of the leading principal block of `prec` is the leading
+    block of the Cholesky factor of `prec`, so a single factorization and
+    triangular solve `w = L^{-1} @ rhs` gives both:
+
+        log|prec^{-1}| = -2 * sum(log(diag(L)))
+        rhs.T @ prec^{-1} @ rhs = w.T @ w
+
+    and the same quantities over `L[:-1,:-1]` and `w[:-1]` for the system without
+    the last variable.
+
+    Parameters
+    ----------
+    prec : np.ndarray
+        Posterior precision matrix with the variable being toggled in the last
+        position. Only the lower triangle is read
+    rhs : np.ndarray
+        Right hand side of the normal equations
+    var : pl.variable.Variable subclass
+        This is the variable that this was called from
+
+    Returns
+    -------
+    (float, float), (float, float)
+        Log determinant of the covariance and `mean.T @ prec @ mean` with the last
+        variable, then without it
+    '''
+    rhs = np.ravel(rhs)
+    try:
+        L = scipy.linalg.cholesky(prec, lower=True, check_finite=False)
+    except np.linalg.LinAlgError:
+        prec = np.tril(prec) + np.tril(prec, -1).T
+        prec_off = prec[:-1,:-1].copy()
+        on = _marginal_logdet_and_quadratic(prec=prec, rhs=rhs, var=var)
+        if prec_off.shape[0] == 0:
+            return on, (0., 0.)
+        return on, _marginal_logdet_and_quadratic(prec=prec_off, rhs=rhs[:-1], var=var)
+    w = scipy.linalg.solve_triangular(L, rhs, lower=True, check_finite=False)
+    log_diag = np.log(np.diag(L))
+    logdet_off = -2. * np.sum(log_diag[:-1])
+    quad_off = w[:-1] @ w[:-1]
+    on = (logdet_off - 2. * log_diag[-1], quad_off + w[-1] ** 2)
+    return on, (logdet_off, quad_off)
+
+@numba.jit(nopython=True, cache=True)
+def _gram_marginal_on_off(XtPX: np.ndarray, XtPy: np.ndarray, cols: np.ndarray,
+    prior_prec: np.ndarray, prior_mean: np.ndarray, out: np.ndarray) -> bool:
+    '''Compiled version of `_marginal_logdet_and_quadratic_on_off` for the system
+    with precision `XtPX[cols,cols] + diag(prior_prec)` and right hand side
+    `XtPy[cols] + prior_prec * prior_mean`, where the products with the data are
+    precomputed for all of the columns.
+
+    The log determinants of the covariance and `mean.T @ prec @ mean` with and
+    without the last column are written into `out`. Returns False if the
+    precision is not positive definite, in which case `out` is not valid.
+    '''
+    k = len(cols)
+    L = np.empty((k, k))
+    w = np.empty(k)
+    logdet = 0.
+    quad = 0.
+    for j in range(k):
+        cj = cols[j]
+        # Column `j` of the Cholesky factor
+        d = XtPX[cj, cj] + prior_prec[j]
+        for m in range(j):
+            d -= L[j, m] * L[j, m]
+        if not d > 0:
+            return False
+        d = np.sqrt(d)
+        L[j, j] = d
+        for i in range(j+1, k):
+            v = XtPX[cols[i], cj]
+            for m in range(j):
+                v -= L[i, m] * L[j, m]
+            L[i, j] = v / d
+        # Forward solve for `w = L^{-1} @ rhs`
+        v = XtPy[cj] + prior_prec[j] * prior_mean[j]
+        for m in range(j):
+            v -= L[j, m] * w[m]
+        w[j] = v / d
+        if j == k - 1:
+            out[2] = logdet
+            out[3] = quad
+        logdet -= 2 * np.log(d)
+        quad += w[j] * w[j]
+    out[0] = logdet
+    out[1] = quad
+    return True
+
+@numba.jit(nopython=True, parallel=True, cache=True)
+def _perturbation_indicator_sweep(arr: np.ndarray, order: np.ndarray, us: np.ndarray,
+    XtPXs: np.ndarray, XtPys: np.ndarray, n_inters: np.ndarray, prior_mean_perts: np.ndarray,
+    prior_prec_perts: np.ndarray, priorvar_logdets: np.ndarray, prior_ll_ons: np.ndarray,
+    prior_ll_offs: np.ndarray, prior_mean_interaction: float,
+    prior_prec_interaction: float) -> np.ndarray:
+    '''Gibbs sweep over the perturbation indicators, one cluster per thread.
+
+    Given the rest of the indicators, the indicators of one cluster only depend on
+    each other, so the clusters are swept in parallel and the perturbations of each
+    cluster are swept in the order given by `order`. The indicator `(pidx, cidx)`
+    is `arr[cidx + pidx * n_clusters]`.
+
+    Parameters
+    ----------
+    arr : np.ndarray(n_perturbations * n_clusters, dtype=bool)
+        Indicators, updated in place
+    order : np.ndarray(n_clusters, n_perturbations)
+        Order to update the perturbations of each cluster
+    us : np.ndarray(n_clusters, n_perturbations)
+        Uniform random numbers to sample each indicator with
+    XtPXs, XtPys : np.ndarray
+        `X.T @ diag(process_prec) @ X` and `X.T @ diag(process_prec) @ y` of each
+        cluster where the columns of `X` are the perturbations followed by the
+        `n_inters[cidx]` positive interactions into the cluster
+    prior_mean_perts, prior_prec_perts, priorvar_logdets : np.ndarray(n_perturbations)
+        Prior parameters of the perturbation magnitudes
+    prior_ll_ons, prior_ll_offs : np.ndarray(n_perturbations)
+        Prior log probabilities of the indicators
+    prior_mean_interaction, prior_prec_interaction : float
+        Prior parameters of the interactions
+
+    Returns
+    -------
+    np.ndarray(n_clusters, dtype=int)
+        Number of indicators updated for each cluster. This is less than
+        `n_perturbations` if the posterior precision was not positive definite,
+        which must then be updated with `update_single_idx_fast`.
+    '''
+    n_clusters, n_perts = order.shape
+    n_done = np.full(n_clusters, n_perts)
+    for cidx in numba.prange(n_clusters):
+        n_inter = n_inters[cidx]
+        k = n_inter + n_perts
+        cols = np.empty(k, dtype=np.int64)
+        prior_mean = np.empty(k)
+        prior_prec = np.empty(k)
+        terms = np.empty(4)
+        off_terms = np.empty(4)
+        # Terms of the current state of the indicators, which is one of the two
+        # states evaluated at the previous step
+        curr_known = False
+        curr_logdet = 0.
+        curr_quad = 0.
+        for i in range(n_inter):
+            cols[i] = n_perts + i
+            prior_mean[i] = prior_mean_interaction
+            prior_prec[i] = prior_prec_interaction
+        for j in range(n_perts):
+            pidx = order[cidx, j]
+            n = n_inter
+            for temp_pidx in range(n_perts):
+                if temp_pidx != pidx and arr[cidx + temp_pidx * n_clusters]:
+                    cols[n] = temp_pidx
+                    prior_mean[n] = prior_mean_perts[temp_pidx]
+                    prior_prec[n] = prior_prec_perts[temp_pidx]
+                    n += 1
+            cols[n] = pidx
+            prior_mean[n] = prior_mean_perts[pidx]
+            prior_prec[n] = prior_prec_perts[pidx]
+            if curr_known and arr[cidx + pidx * n_clusters]:
+                # The current state is the on state so only factor the off state
+                terms[0] = curr_logdet
+                terms[1] = curr_quad
+                terms[2] = 0.
+                terms[3] = 0.
+                if n > 0:
+                    if not _gram_marginal_on_off(XtPXs[cidx], XtPys[cidx], cols[:n],
+                        prior_prec[:n], prior_mean[:n], off_terms):
+                        n_done[cidx] = j
+                        break
+                    # The first two entries are for the system with all `n` columns
+                    terms[2] = off_terms[0]
+                    terms[3] = off_terms[1]
+            elif not _gram_marginal_on_off(XtPXs[cidx], XtPys[cidx], cols[:n+1],
+                prior_prec[:n+1], prior_mean[:n+1], terms):
+                n_done[cidx] = j
+                break
+            bEbprior = prior_mean_perts[pidx] ** 2 * prior_prec_perts[pidx]
+            ll_on = 0.5 * (terms[0] - priorvar_logdets[pidx]) + \
+                0.5 * (terms[1] - bEbprior) + prior_ll_ons[pidx]
+            ll_off = 0.5 * (terms[2] + terms[3]) + prior_ll_offs[pidx]
+            m = max(ll_on, ll_off)
+            p_off = np.exp(ll_off - m) / (np.exp(ll_on - m) + np.exp(ll_off - m))
+            on = us[cidx, j] > p_off
+            arr[cidx + pidx * n_clusters] = on
+            if on:
+                curr_logdet = terms[0]
+                curr_quad = terms[1]
+            else:
+                curr_logdet = terms[2]
+                curr_quad = terms[3]
+            curr_known = True
+    return n_done
+
+@numba.jit(nopython=True, fastmath=True, cache=True)
+def _sics_log_stats(values: np.ndarray) -> Tuple[float, float]:
+    '''Sums of `1/values` and `log(values)`. These are all that the summed
+    `pl.random.sics.logpdf` over `values` depends on, for any dof and scale.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Values to evaluate
+
+    Returns
+    -------
+    float, float
+        Sum of the reciprocals, sum of the logs
+    '''
+    sum_inv = 0.
+    sum_log = 0.
+    for i in range(len(values)):
+        sum_inv += 1 / values[i]
+        sum_log += math.log(values[i])
+    return sum_inv, sum_log
+
+@numba.jit(nopython=True, fastmath=True, cache=True)
+def _sics_logpdf_sum_from_stats(n: int, sum_inv: float, sum_log: float, dof: float,
+    scale: float) -> float:
+    '''Sum of `pl.random.sics.logpdf` over `n` values from their
+    `_sics_log_stats`
+
+    Parameters
+    ----------
+    n : int
+        Number of values
+    sum_inv, sum_log : float
+        Output of `_sics_log_stats`
+    dof : float
+        Degrees of freedom of the scaled inverse chi-squared
+    scale : float
+        Scale of the scaled inverse chi-squared
+
+    Returns
+    -------
+    float
+    '''
+    dofdiv2 = dof/2
+    c = scale * dofdiv2
+    return n * (dofdiv2 * math.log(c) - math.lgamma(dofdiv2)) - c * sum_inv - \
+        (1 + dofdiv2) * sum_log
+
+@numba.jit(nopython=True, cache=True)
+def _truncnormal_log_proposal_ratio(prev_value: float, new_value: float, scale: float,
+    low: float, high: float) -> float:
+    '''`log q(prev | new) - log q(new | prev)` for a truncated normal proposal
+    `q` centered at the current value, as used in a MH ratio.
+
+    The quadratic and `log(scale)` terms of the two log densities are equal and
+    cancel, so only the normalizations `Phi(b) - Phi(a)` (with `a = (low-loc)/scale`
+    and `b = (high-loc)/scale`) are left. These are written with `erf`, which is
+    accurate because both centers are inside `[low, high]`, so `a <= 0 <= b`
+
+    Parameters
+    ----------
+    prev_value, new_value : float
+        Current and proposed values
+    scale : float
+        Standard deviation of the untruncated normal
+    low, high : float
+        Truncation bounds
+
+    Returns
+    -------
+    float
+    '''
+    c = scale * math.sqrt(2.)
+    prev_norm = math.erf((high - prev_value) / c) - math.erf((low - prev_value) / c)
+    new_norm = math.erf((high - new_value) / c) - math.erf((low - new_value) / c)
+    return math.log(prev_norm) - math.log(new_norm)
+
+@numba.jit(nopython=True, cache=True)
+def _qpcr_resid_sums(values: np.ndarray, tidxs: np.ndarray, cols: np.ndarray,
+    log_totals: np.ndarray, n_tidxs: int) -> np.ndarray:
+    '''Sum of the squared residuals of the qPCR measurements for each time index,
+    without making the intermediate residual arrays
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Flattened qPCR measurements in log space
+    tidxs : np.ndarray
+        Time index of each measurement
+    cols : np.ndarray
+        Column of `log_totals` that each measurement is compared against
+    log_totals : np.ndarray
+        Log of the total latent abundance at each time point
+    n_tidxs : int
+        Number of time indices
+
+    Returns
+    -------
+    np.ndarray
+    '''
+    out = np.zeros(n_tidxs)
+    for i in range(len(values)):
+        d = values[i] - log_totals[cols[i]]
+        out[tidxs[i]] += d * d
+    return out
+
+@numba.jit(nopython=True, cache=True)
+def _qpcr_dof_mh_step(xs: np.ndarray, scale: float, prev_dof: float, new_dof: float,
+    proposal_std: float, low: float, high: float, log_u: float) -> Tuple[float, bool]:
+    '''MH accept/reject of moving the degrees of freedom of a qPCR set from
+    `prev_dof` to `new_dof`, with a truncated normal proposal on `[low, high]`
+
+    Parameters
+    ----------
+    xs : np.ndarray
+        qPCR variances of the set
+    scale : float
+        Scale of the set
+    prev_dof, new_dof : float
+        Current and proposed degrees of freedom
+    proposal_std, low, high : float
+        Standard deviation and bounds of the proposal
+    log_u : float
+        Log of the uniform used to accept or reject
+
+    Returns
+    -------
+    float, bool
+        The next value of the degrees of freedom and whether it was accepted
+    '''
+    # Both likelihoods come from a single pass over `xs`
+    sum_inv, sum_log = _sics_log_stats(xs)
+    prev_target_ll = _sics_logpdf_sum_from_stats(len(xs), sum_inv, sum_log, prev_dof, scale)
+    new_target_ll = _sics_logpdf_sum_from_stats(len(xs), sum_inv, sum_log, new_dof, scale)
+    r = (new_target_ll - prev_target_ll) + _truncnormal_log_proposal_ratio(
+        prev_dof, new_dof, proposal_std, low, high)
+    if r >= log_u:
+        return new_dof, True
+    return prev_dof, False
+
+@numba.jit(nopython=True, cache=True)
+def _qpcr_scale_mh_step(xs: np.ndarray, dof: float, prev_scale: float,
+    new_scale: float, prior_dof: float, prior_scale: float, proposal_std: float,
+    low: float, high: float, log_u: float) -> Tuple[float, bool]:
+    '''MH accept/reject of moving the scale of a qPCR set from `prev_scale` to
+    `new_scale` under a SICS prior, with a truncated normal proposal on
+    `[low, high]`
+
+    Parameters
+    ----------
+    xs : np.ndarray
+        qPCR variances of the set
+    dof : float
+        Degrees of freedom of the set
+    prev_scale, new_scale : float
+        Current and proposed scale
+    prior_dof, prior_scale : float
+        Parameters of the SICS prior on the scale
+    proposal_std, low, high : float
+        Standard deviation and bounds of the proposal
+    log_u : float
+        Log of the uniform used to accept or reject
+
+    Returns
+    -------
+    float, bool
+        The next value of the scale and whether it was accepted
+    '''
+    # The dofs are the same for both scales, so the `lgamma` and `dof*log(dof)`
+    # terms of the likelihood and the prior cancel, as does `sum(log(xs))`.
+    # Only the terms that depend on the scale are left
+    sum_inv, _ = _sics_log_stats(xs)
+    dofdiv2 = dof/2
+    prior_dofdiv2 = prior_dof/2
+    dlog_scale = math.log(new_scale) - math.log(prev_scale)
+    target_ll_diff = len(xs) * dofdiv2 * dlog_scale - \
+        dofdiv2 * (new_scale - prev_scale) * sum_inv - \
+        prior_scale * prior_dofdiv2 * (1 / new_scale - 1 / prev_scale) - \
+        (1 + prior_dofdiv2) * dlog_scale
+    r = target_ll_diff + _truncnormal_log_proposal_ratio(
+        prev_scale, new_scale, proposal_std, low, high)
+    if r >= log_u:
+        return new_scale, True
+    return prev_scale, False
+
+def _group_qpcr_data_locs(data_locs: List[Tuple[int, int]]) -> \
+    Tuple[List[Tuple[int, np.ndarray]], np.ndarray]:
+    '''Group the (replicate index, time index) locations of a set of qPCR
+    variances by replicate
+
+    Parameters
+    ----------
+    data_locs : list((int, int))
+        Replicate index and time index of each qPCR variance
+
+    Returns
+    -------
+    list((int, np.ndarray)), np.ndarray
+        The time indices for each replicate, and the position of each location
+        in the concatenation of those groups
+    '''
+    ridxs = np.asarray([ridx for ridx, _ in data_locs], dtype=int)
+    tidxs = np.asarray([tidx for _, tidx in data_locs], dtype=int)
+    order = np.argsort(ridxs, kind='stable')
+    groups = [(ridx, tidxs[order][ridxs[order] == ridx]) for ridx in np.unique(ridxs)]
+    return groups, np.argsort(order)
+
+def _gather_qpcr_variances(qpcr_variances: List[Variable],
+    groups: List[Tuple[int, np.ndarray]], positions: np.ndarray,
+    scratch: np.ndarray, out: np.ndarray) -> np.ndarray:
+    '''Gather the current qPCR variances at the locations grouped by
+    `_group_qpcr_data_locs`, in the order of the original locations
+
+    Parameters
+    ----------
+    qpcr_variances : list(qPCRVarianceReplicate)
+        qPCR variances of each replicate
+    groups, positions : list((int, np.ndarray)), np.ndarray
+        Output of `_group_qpcr_data_locs`
+    scratch, out : np.ndarray
+        Buffers with one element per location. The variances are gathered into
+        `scratch` in the grouped order and then into `out` in the original order
+
+    Returns
+    -------
+    np.ndarray
+        `out`
+    '''
+    i = 0
+    for ridx, tidxs in groups:
+        np.take(qpcr_variances[ridx].value, tidxs, out=scratch[i:i+len(tidxs)])
+        i += len(tidxs)
+    return np.take(scratch, positions, out=out)
+
+def _has_diagonal_normal_equations(X: scipy.sparse.spmatrix,
+    process_prec: scipy.sparse.spmatrix, prior_prec: scipy.sparse.spmatrix) -> bool:
+    '''Checks if `_diagonal_normal_equations` applies to these matrices: every row
+    of `X` has at most a single nonzero and both precision matrices are diagonal.
+    This only depends on the sparsity structure of the matrices, which is fixed
+    for the growth and self-interaction design matrices, so the result can be
+    computed once and reused.
+
+    Parameters
+    ----------
+    X : scipy.sparse
+        Design matrix
+    process_prec : scipy.sparse
+        Process precision matrix
+    prior_prec : scipy.sparse
+        Prior precision matrix
+
+    Returns
+    -------
+    bool
+    '''
+    if not (scipy.sparse.issparse(X) and scipy.sparse.issparse(process_prec) and \
+        scipy.sparse.issparse(prior_prec)):
+        return False
+    X = X.tocoo()
+    if X.nnz > 0 and np.bincount(X.row, minlength=X.shape[0]).max() > 1:
+        return False
+    return process_prec.count_nonzero() == np.count_nonzero(process_prec.diagonal()) and \
+        prior_prec.count_nonzero() == np.count_nonzero(prior_prec.diagonal())
+
+def _diagonal_normal_equations(X: scipy.sparse.spmatrix, process_prec: scipy.sparse.spmatrix,
+    y: np.ndarray, prior_prec: scipy.sparse.spmatrix, pm: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''Build the diagonal of `X.T @ process_prec @ X + prior_prec` and the vector
+    `X.T @ process_prec @ y + pm` directly from the sparsity structure of `X`.
+
+    This only applies when every row of `X` has at most a single nonzero and both
+    precision matrices are diagonal (see `_has_diagonal_normal_equations`), which is
+    the case for the growth and self-interaction design matrices. We accumulate over
+    the nonzeros of `X` instead of doing the sparse matrix-matrix products.
+
+    Parameters
+    ----------
+    X : scipy.sparse
+        Design matrix
+    process_prec : scipy.sparse
+        Process precision matrix
+    y : np.ndarray
+        Observation vector
+    prior_prec : scipy.sparse
+        Prior precision matrix
+    pm : np.ndarray
+        Prior precision times the prior mean
+
+    Returns
+    -------
+    np.ndarray, np.ndarray
+        Diagonal of the posterior precision and the right hand side of the posterior
+        mean
+    '''
+    X = X.tocoo()
+    w = process_prec.diagonal()[X.row] * X.data
+    prec_diag = np.bincount(X.col, weights=w*X.data, minlength=X.shape[1]) + \
+        prior_prec.diagonal()
+    mean_rhs = np.bincount(X.col, weights=w*np.ravel(y)[X.row], minlength=X.shape[1]) + \
+        np.ravel(pm)
+    return prec_diag, mean_rhs
+
+def _posterior_mean_and_variance(prec: Union[scipy.sparse.spmatrix, np.ndarray],
+    rhs: np.ndarray, var: Variable) -> Tuple[np.ndarray, np.ndarray]:
+    '''Computes the mean `inv(prec) @ rhs` and the diagonal of `inv(prec)` of a
+    Gaussian posterior with a Cholesky factorization instead of forming the
+    inverse. If `prec` is not positive definite we fall back to `pinv`.
+
+    Parameters
+    ----------
+    prec : nxn matrix (np.ndarray, scipy.sparse)
+        Posterior precision matrix
+    rhs : np.ndarray
+        Right hand side of the posterior mean
+    var : pl.variable.Variable subclass
+        This is the variable that this was called from
+
+    Returns
+    -------
+    np.ndarray, np.ndarray
+        Posterior mean and the diagonal of the posterior covariance
+    '''
+    if scipy.sparse.issparse(prec):
+        prec = prec.toarray()
+    rhs = np.ravel(rhs)
+    if prec.shape[0] == 0:
+        return np.zeros(0), np.zeros(0)
+    try:
+        L = scipy.linalg.cholesky(prec, lower=True, check_finite=False)
+    except np.linalg.LinAlgError:
+        cov = pinv(prec, var)
+        return cov @ rhs, np.diag(cov)
+    mean = scipy.linalg.cho_solve((L, True), rhs, check_finite=False)
+
+    # diag(inv(L L^T)) are the squared column norms of inv(L). Invert the triangular
+    # factor in place instead of solving against the identity
+    Linv, info = scipy.linalg.lapack.dtrtri(L, lower=1, overwrite_c=1)
+    if info != 0:
+        cov = pinv(prec, var)
+        return cov @ rhs, np.diag(cov)
+    return mean, np.einsum('ij,ij->j', Linv, Linv)
+
+def _is_diagonal(M: scipy.sparse.spmatrix) -> bool:
+    '''Checks if the sparse matrix `M` is diagonal
+    '''
+    return scipy.sparse.issparse(M) and M.count_nonzero() == np.count_nonzero(M.diagonal())
+
+@numba.jit(nopython=True, cache=True)
+def _assemble_normal_equations(data: np.ndarray, indices: np.ndarray, indptr: np.ndarray,
+    process_prec: np.ndarray, y: np.ndarray, prior_prec: np.ndarray, prior_mean: np.ndarray,
+    prec: np.ndarray, b: np.ndarray):
+    '''Builds the posterior precision `X.T @ diag(process_prec) @ X + diag(prior_prec)`
+    and `X.T @ diag(process_prec) @ y + prior_prec * prior_mean` in a single pass over
+    the rows of `X`, which is given by the arrays of a CSR matrix. The results are
+    added into `prec` and `b`, which must be zero.
+    '''
+    for i in range(len(indptr)-1):
+        start = indptr[i]
+        end = indptr[i+1]
+        for jj in range(start, end):
+            j = indices[jj]
+            xj = data[jj] * process_prec[i]
+            b[j] += xj * y[i]
+            for kk in range(start, end):
+                prec[j, indices[kk]] += xj * data[kk]
+    for j in range(len(prior_prec)):
+        prec[j, j] += prior_prec[j]
+        b[j] += prior_prec[j] * prior_mean[j]
+
+def _sample_gaussian_cg(X: scipy.sparse.spmatrix, process_prec: scipy.sparse.spmatrix,
+    prior_prec: np.ndarray, b: np.ndarray, tol: float=1e-8,
+    maxiter: int=None) -> np.ndarray:
+    '''Sample from the Gaussian with precision `X.T @ process_prec @ X + prior_prec`
+    and mean `inv(prec) @ b` with the prior-preconditioned conjugate gradient
+    sampler in [1]. The precision is only used through matrix-vector products, so it
+    is never densified or factorized.
+
+    We perturb the right hand side so that the solution of the system is a draw from
+    the posterior
+
+        b' = b + X.T @ process_prec^{1/2} @ z1 + prior_prec^{1/2} @ z2
+
+    and solve `prec @ x = b'` with preconditioned conjugate gradients. `process_prec`
+    must be diagonal.
+
+    Parameters
+    ----------
+    X : scipy.sparse
+        Design matrix
+    process_prec : scipy.sparse
+        Diagonal process precision matrix
+    prior_prec : np.ndarray
+        Diagonal of the prior precision matrix
+    b : np.ndarray
+        `X.T @ process_prec @ y + prior_prec @ prior_mean`
+    tol : float
+        Relative tolerance of the residual
+    maxiter : int, None
+        Maximum number of iterations. If None, it is set to the dimension
+
+    Returns
+    -------
+    np.ndarray
+
+    References
+    ----------
+    [1] Nishimura A, Suchard MA. Prior-preconditioned conjugate gradient method for
+        accelerated Gibbs sampling in "large n & large p" Bayesian sparse regression.
+        Journal of the American Statistical Association. 2022.
+    '''
+    X = scipy.sparse.csr_matrix(X)
+    XT = X.T.tocsr()
+    process_diag = process_prec.diagonal()
+    prior_diag = prior_prec
+    n, p = X.shape
+
+    b = np.ravel(b) + XT @ (np.sqrt(process_diag) * npr.standard_normal(n)) + \
+        np.sqrt(prior_diag) * npr.standard_normal(p)
+    if maxiter is None:
+        maxiter = p
+    precond = 1/prior_diag
+
+    x = np.zeros(p, dtype=float)
+    r = b.copy()
+    z = precond * r
+    d = z.copy()
+    rz = r @ z
+    threshold = tol * np.linalg.norm(b)
+    if np.linalg.norm(r) <= threshold:
+        return x
+    for _ in range(maxiter):
+        Ad = XT @ (process_diag * (X @ d)) + prior_diag * d
+        alpha = rz / (d @ Ad)
+        x += alpha * d
+        r -= alpha * Ad
+        if np.linalg.norm(r) <= threshold:
+            return x
+        z = precond * r
+        rz_new = r @ z
+        d = z + (rz_new / rz) * d
+        rz = rz_new
+    logger.warning('Conjugate gradient sampler did not converge in {} iterations ' \
+        '(residual {}, target {})'.format(maxiter, np.linalg.norm(r), threshold))
+    return x
+
+def _least_squares(X: Union[scipy.sparse.spmatrix, np.ndarray], y: np.ndarray) -> np.ndarray:
+    '''Solves the unregularized least squares problem `min ||X b - y||` directly on
+    `X` instead of forming the normal equations (which squares the condition number)
+
+    Parameters
+    ----------
+    X : np.ndarray, scipy.sparse
+        Design matrix
+    y : np.ndarray
+        Observations
+
+    Returns
+    -------
+    np.ndarray
+        Flattened least squares solution
+    '''
+    if scipy.sparse.issparse(X):
+        X = X.toarray()
+    b = scipy.linalg.lstsq(X, np.asarray(y), lapack_driver='gelsy', check_finite=False)[0]
+    return np.ravel(b)
+
 def _scalar_visualize(obj: Variable, path: str, f: IO, section: str='posterior',
     log_scale: bool=True) -> IO:
     '''Render the traces in the folder `basepath` and write the
@@ -367,6 +1128,8 @@ def _scalar_visualize(obj: Variable, path: str, f: IO, section: str='posterior',
     -------
     _io.TextIOWrapper
     '''
+    from . import visualization
+    import matplotlib.pyplot as plt
     if f is not None:
         f.write('\n\n###################################\n{}'.format(obj.name))
         f.write('\n###################################\n')
@@ -402,6 +1165,73 @@ def _scalar_visualize(obj: Variable, path: str, f: IO, section: str='posterior',
     plt.close()
     return f
 
+def _render_taxa_posteriors(basepath: str, names: List[str], posterior_trace: np.ndarray,
+    trace: np.ndarray, n_burnin: int, prior_samples: np.ndarray, true_value: np.ndarray=None,
+    section: str='posterior'):
+    '''Render the posterior (with the prior on top) and the trace of each taxon in
+    `names` and save it to `basepath/<name>.pdf`. This is a module level function
+    so that it can be sent to a worker process.
+
+    Parameters
+    ----------
+    basepath : str
+        Folder to write the files to
+    names : list(str)
+        Names of the taxa. These are used for the title and the filename
+    posterior_trace : np.ndarray((n_samples, len(names)))
+        Samples to make the histogram of the posterior from
+    trace : np.ndarray((n_total_samples, len(names)))
+        Samples to plot the trace of. The first `n_burnin` are the burn-in samples
+    n_burnin : int
+        Number of burn-in samples at the start of `trace`
+    prior_samples : np.ndarray
+        Samples from the prior that are plotted on top of the posterior
+    true_value : np.ndarray(len(names)), None
+        Ground truth values, if any
+    section : str
+        Label of the posterior histogram
+    '''
+    from . import visualization
+    import matplotlib.pyplot as plt
+    # Reuse the same figure for every taxon instead of making a new one each time
+    fig = plt.figure()
+    ax_posterior = fig.add_subplot(1,2,1)
+    ax_trace = fig.add_subplot(1,2,2)
+    for idx, name in enumerate(names):
+        ax_posterior.cla()
+        ax_trace.cla()
+        visualization.render_trace(var=posterior_trace, idx=idx, plt_type='hist',
+            label=section, color='blue', ax=ax_posterior, rasterized=True)
+
+        # Get the limits and only look at the posterior within 20% range +- of
+        # this number
+        low_x, high_x = ax_posterior.get_xlim()
+
+        visualization.render_trace(var=prior_samples, plt_type='hist',
+            label='prior', color='red', ax=ax_posterior, rasterized=True)
+
+        if true_value is not None:
+            ax_posterior.axvline(x=true_value[idx], color='red', alpha=0.65,
+                label='True Value')
+
+        ax_posterior.legend()
+        ax_posterior.set_xlim(left=low_x*.8, right=high_x*1.2)
+
+        # plot the trace
+        visualization.render_trace(var=trace, idx=idx, plt_type='trace',
+            ax=ax_trace, n_burnin=n_burnin, rasterized=True)
+
+        if true_value is not None:
+            ax_trace.axhline(y=true_value[idx], color='red', alpha=0.65,
+                label='True Value')
+            ax_trace.legend()
+
+        fig.suptitle('{}'.format(name))
+        fig.tight_layout()
+        fig.subplots_adjust(top=0.85)
+        fig.savefig(os.path.join(basepath, '{}.pdf'.format(name)))
+    plt.close(fig)
+
 def _make_cluster_order(graph: Graph, section: str) -> np.ndarray:
     '''Make a cluster ordering that is consistent
 
@@ -719,7 +1549,9 @@ class ProcessVarGlobal(pl.variables.SICS):
         if not cov:
             a = 1/a
         if sparse:
-            return scipy.sparse.dia_matrix((a,[0]), shape=(len(a),len(a))).tocsc()
+            # The precision is diagonal so keep it in DIA format, which multiplies
+            # without going through the general sparse-sparse product
+            return scipy.sparse.dia_matrix((a,[0]), shape=(len(a),len(a)))
         else:
             return np.diag(a)
 
@@ -1298,6 +2130,9 @@ class ClusterAssignments(pl.graph.Node):
         -------
         _io.TextIOWrapper
         '''
+        from . import visualization
+        import matplotlib.pyplot as plt
+        import seaborn as sns
         from matplotlib.colors import LogNorm
         taxa = self.G.data.taxa
         f.write('\n\n###################################\n')
@@ -1529,22 +2364,18 @@ class ClusterAssignments(pl.graph.Node):
         # Calculate the marginalization
         # =============================
         beta_prec = X.T @ process_prec @ X + prior_prec
-        beta_cov = pinv(beta_prec, self)
-        beta_mean = beta_cov @ ( X.T @ process_prec @ y + prior_prec @ prior_mean )
-        beta_mean = np.asarray(beta_mean).reshape(-1,1)
 
         try:
-            beta_logdet = log_det(beta_cov, self)
+            beta_logdet, bEb = _marginal_logdet_and_quadratic(prec=beta_prec.copy(),
+                rhs=X.T @ process_prec @ y + prior_prec @ prior_mean, var=self)
         except:
             logger.critical('Crashed in log_det')
-            logger.critical('beta_cov:\n{}'.format(beta_cov))
             logger.critical('prior_prec\n{}'.format(prior_prec))
             raise
         priorvar_logdet = log_det(prior_var, self)
         ll2 = 0.5 * (beta_logdet - priorvar_logdet)
 
         bEbprior = np.asarray(prior_mean.T @ prior_prec @ prior_mean)[0,0]
-        bEb = np.asarray(beta_mean.T @ beta_prec @ beta_mean)[0,0]
         ll3 = 0.5 * (bEb  - bEbprior)
 
         # print('prior_prec truth:\n', prior_prec)
@@ -1668,33 +2499,30 @@ class ClusterAssignments(pl.graph.Node):
         X = self.G.data.construct_rhs(keys=rhs, toarray=True)
 
         process_prec = self.process_prec
-        prior_prec = build_prior_covariance(G=self.G, cov=False, order=rhs, sparse=False)
-        prior_prec_diag = np.diag(prior_prec)
-        prior_var = build_prior_covariance(G=self.G, cov=True, order=rhs, sparse=False)
-        prior_mean = build_prior_mean(G=self.G, order=rhs, shape=(-1,1))
+        # The prior precision is diagonal so only keep the diagonal
+        prior_prec_diag = build_prior_covariance(G=self.G, cov=False, order=rhs, diag=True)
+        prior_mean = build_prior_mean(G=self.G, order=rhs)
 
         # Calculate the marginalization
         # =============================
         a = X.T * process_prec
 
-        beta_prec = a @ X + prior_prec
-        beta_cov = pinv(beta_prec, self)
-        beta_mean = beta_cov @ ( a @ y + prior_prec @ prior_mean )
-        beta_mean = np.asarray(beta_mean).reshape(-1,1)
+        beta_prec = a @ X
+        beta_prec[np.diag_indices_from(beta_prec)] += prior_prec_diag
 
         try:
-            beta_logdet = log_det(beta_cov, self)
+            beta_logdet, bEb = _marginal_logdet_and_quadratic(prec=beta_prec,
+                rhs=np.ravel(a @ y) + prior_prec_diag * prior_mean, var=self)
         except:
             logger.critical('Crashed in log_det')
-            logger.critical('beta_cov:\n{}'.format(beta_cov))
-            logger.critical('prior_prec\n{}'.format(prior_prec))
+            logger.critical('prior_prec_diag\n{}'.format(prior_prec_diag))
             raise
-        priorvar_logdet = log_det(prior_var, self)
+        priorvar_logdet = -np.sum(np.log(prior_prec_diag))
         ll2 = 0.5 * (beta_logdet - priorvar_logdet)
 
-        a = np.sum((prior_mean.ravel() ** 2) *prior_prec_diag)
+        a = np.sum((prior_mean ** 2) *prior_prec_diag)
         # np.asarray(prior_mean.T @ prior_prec @ prior_mean)[0,0]
-        b = np.asarray(beta_mean.T @ beta_prec @ beta_mean)[0,0]
+        b = bEb
         ll3 = -0.5 * (a  - b)
 
         return ll2+ll3
@@ -1715,10 +2543,9 @@ class ClusterAssignments(pl.graph.Node):
         X = self.G.data.construct_rhs(keys=rhs, toarray=False)
 
         process_prec = self.process_prec_matrix
-        prior_prec = build_prior_covariance(G=self.G, cov=False, order=rhs, sparse=True)
+        # The prior precision is diagonal so only keep the diagonal
         prior_prec_diag = build_prior_covariance(G=self.G, cov=False, order=rhs, diag=True)
-        prior_var = build_prior_covariance(G=self.G, cov=True, order=rhs, sparse=True)
-        prior_mean = build_prior_mean(G=self.G, order=rhs, shape=(-1,1))
+        prior_mean = build_prior_mean(G=self.G, order=rhs)
 
         # Calculate the marginalization
         # =============================
@@ -1740,28 +2567,26 @@ class ClusterAssignments(pl.graph.Node):
         # print(prior_mean.shape)
 
         a = X.T.dot(process_prec)
-        beta_prec = a.dot(X) + prior_prec
-        beta_cov = pinv(beta_prec, self)
-        beta_mean = beta_cov @ ( a.dot(y) + prior_prec.dot(prior_mean))
-        beta_mean = np.asarray(beta_mean).reshape(-1,1)
+        beta_prec = a.dot(X).toarray()
+        beta_prec[np.diag_indices_from(beta_prec)] += prior_prec_diag
 
         try:
-            beta_logdet = log_det(beta_cov, self)
+            beta_logdet, bEb = _marginal_logdet_and_quadratic(prec=beta_prec,
+                rhs=np.ravel(a.dot(y)) + prior_prec_diag * prior_mean, var=self)
         except:
             logger.critical('Crashed in log_det')
-            logger.critical('beta_cov:\n{}'.format(beta_cov))
-            logger.critical('prior_prec\n{}'.format(prior_prec))
+            logger.critical('prior_prec_diag\n{}'.format(prior_prec_diag))
             raise
-        priorvar_logdet = log_det(prior_var, self)
+        priorvar_logdet = -np.sum(np.log(prior_prec_diag))
         ll2 = 0.5 * (beta_logdet - priorvar_logdet)
 
-        a = np.sum((prior_mean.ravel() ** 2) *prior_prec_diag)
+        a = np.sum((prior_mean ** 2) *prior_prec_diag)
         # np.asarray(prior_mean.T @ prior_prec @ prior_mean)[0,0]
 
         # print('beta_prec.shape', beta_prec.shape)
         # print('beta_mean.shape', beta_mean.shape)
 
-        b = np.asarray(beta_mean.T @ beta_prec.dot(beta_mean))[0,0]
+        b = bEb
         ll3 = -0.5 * (a  - b)
 
         return ll2+ll3
@@ -2079,7 +2904,7 @@ class SingleClusterFullParallelization(pl.multiprocessing.PersistentWorker):
             self.prior_mean_pert = prior_mean_pert
 
         self.process_prec_matrix = scipy.sparse.dia_matrix(
-            (process_prec_diag,[0]), shape=(len(process_prec_diag),len(process_prec_diag))).tocsc()
+            (process_prec_diag,[0]), shape=(len(process_prec_diag),len(process_prec_diag)))
 
     def initialize_oidx(self, interaction_on_idxs: np.ndarray, perturbation_on_idxs: np.ndarray):
         '''Pass in the parameters that change for every OTU - potentially
@@ -2240,15 +3065,12 @@ class SingleClusterFullParallelization(pl.multiprocessing.PersistentWorker):
 
         a = X.T.dot(process_prec)
         beta_prec = a.dot(X) + prior_prec
-        beta_cov = pinv(beta_prec, self)
-        beta_mean = beta_cov @ (a.dot(y) + prior_prec.dot(prior_mean))
-        beta_mean = np.asarray(beta_mean).reshape(-1,1)
 
         try:
-            beta_logdet = log_det(beta_cov, self)
+            beta_logdet, bEb = _marginal_logdet_and_quadratic(prec=beta_prec.toarray(),
+                rhs=a.dot(y) + prior_prec.dot(prior_mean), var=self)
         except:
             logger.critical('Crashed in log_det')
-            logger.critical('beta_cov:\n{}'.format(beta_cov))
             logger.critical('prior_prec\n{}'.format(prior_prec))
             raise
 
@@ -2256,7 +3078,6 @@ class SingleClusterFullParallelization(pl.multiprocessing.PersistentWorker):
         ll2 = 0.5 * (beta_logdet - priorvar_logdet)
 
         bEbprior = np.asarray(prior_mean.T @ prior_prec.dot(prior_mean))[0,0]
-        bEb = np.asarray(beta_mean.T @ beta_prec.dot(beta_mean) )[0,0]
         ll3 = 0.5 * (bEb - bEbprior)
 
         self.a = a
@@ -2408,6 +3229,8 @@ class TrajectorySet(pl.graph.Node):
         vmin: Union[float, int]=None, vmax: Union[float, int]=None):
         '''Visualize the replicate at index `ridx`
         '''
+        from . import visualization
+        import matplotlib.pyplot as plt
         subjset = self.G.data.subjects
         taxa = subjset.taxa
         subj = subjset.iloc(ridx)
@@ -3869,7 +4692,8 @@ class PriorVarInteractions(pl.variables.SICS):
         x = self.interactions.obj.get_values(use_indicators=True)
         mu = self.G[STRNAMES.PRIOR_MEAN_INTERACTIONS].value
 
-        se = np.sum(np.square(x - mu))
+        d = np.asarray(x, dtype=float) - mu
+        se = d @ d
         n = len(x)
 
         self.dof.value = self.prior.dof.value + n
@@ -4172,6 +4996,8 @@ class ClusterInteractionValue(pl.variables.MVN):
         self._strr = 'None'
 
     def __str__(self) -> str:
+        if self._strr is None:
+            self._strr = str(self.obj.get_values(use_indicators=True))
         return self._strr
 
     def __len__(self) -> int:
@@ -4252,13 +5078,21 @@ class ClusterInteractionValue(pl.variables.MVN):
         else:
             raise ValueError('`value_option` ({}) not recognized'.format(value_option))
 
-        self._strr = str(self.obj.get_values(use_indicators=True))
+        self.update_str()
         self.value = self.obj.get_values(use_indicators=True)
 
-    def update(self):
+    def update(self, X: scipy.sparse.spmatrix=None, y: np.ndarray=None):
         '''Update the values (where the indicators are positive) using a multivariate normal
         distribution - call this from regress coeff if you want to update the interactions
         conditional on all the other parameters.
+
+        Parameters
+        ----------
+        X : scipy.sparse, None
+            Design matrix of the interactions. If None, it is built from the data
+        y : np.ndarray, None
+            Observations conditional on everything except the interactions. If None,
+            it is built from the data
         '''
         if self.obj.sample_iter < self.delay:
             return
@@ -4272,16 +5106,18 @@ class ClusterInteractionValue(pl.variables.MVN):
         lhs = [
             STRNAMES.GROWTH_VALUE,
             STRNAMES.SELF_INTERACTION_VALUE]
-        X = self.G.data.construct_rhs(keys=rhs)
-        y = self.G.data.construct_lhs(keys=lhs,
-            kwargs_dict={STRNAMES.GROWTH_VALUE:{
-                'with_perturbations':self._there_are_perturbations}})
+        if X is None:
+            X = self.G.data.construct_rhs(keys=rhs)
+        if y is None:
+            y = self.G.data.construct_lhs(keys=lhs,
+                kwargs_dict={STRNAMES.GROWTH_VALUE:{
+                    'with_perturbations':self._there_are_perturbations}})
         process_prec = self.G[STRNAMES.PROCESSVAR].build_matrix(
             cov=False, sparse=True)
         prior_prec = build_prior_covariance(G=self.G, cov=False,
             order=rhs, sparse=True)
 
-        pm = prior_prec @ (self.prior.mean.value * np.ones(prior_prec.shape[0]).reshape(-1,1))
+        pm = prior_prec @ np.full((prior_prec.shape[0], 1), self.prior.loc.value)
 
         prec = X.T @ process_prec @ X + prior_prec
         cov = pinv(prec, self)
@@ -4299,14 +5135,15 @@ class ClusterInteractionValue(pl.variables.MVN):
         self.obj.set_values(arr=value, use_indicators=True)
         self.update_str()
 
-        if np.any(np.isnan(self.value)):
+        if np.isnan(np.sum(self.value)):
             logger.critical('mean: {}'.format(self.mean.value))
             logger.critical('nan in cov: {}'.format(np.any(np.isnan(self.cov.value))))
             logger.critical('value: {}'.format(self.value))
             raise ValueError('`Values in {} are nan: {}'.format(self.name, self.value))
 
     def update_str(self):
-        self._strr = str(self.obj.get_values(use_indicators=True))
+        # The string is only made when it is printed in `__str__`
+        self._strr = None
 
     def set_trace(self):
         self.obj.set_trace()
@@ -4339,6 +5176,8 @@ class ClusterInteractionValue(pl.variables.MVN):
             have identical values, so we can choose any taxon within the cluster to
             represent it
         '''
+        from . import visualization
+        import matplotlib.pyplot as plt
         if not self.G.inference.tracer.is_being_traced(self.obj.name):
             logger.info('Interactions are not being learned')
 
@@ -4410,7 +5249,10 @@ class ClusterInteractionIndicators(pl.variables.Variable):
             'debug': pool is done sequentially and not sent to processors
             'full': pool is done at different processors
     relative : bool
-        Whether you update using the relative marginal likelihood or not.
+        Whether you update using the relative marginal likelihood or not. If not,
+        `update_slow` recomputes the full marginal likelihood for each indicator.
+        This is the reference implementation and is only meant for checking
+        `update_relative`.
     '''
     def __init__(self, prior: variables.Beta, mp: str=None, relative: bool=True, **kwargs):
         if not pl.isbool(relative):
@@ -4483,20 +5325,12 @@ class ClusterInteractionIndicators(pl.variables.Variable):
         for ridx in range(self.G.data.n_replicates):
             self.ndts_bias.append(
                 np.arange(0, self.G.data.n_dts_for_replicate[ridx] * self.n_taxa, self.n_taxa))
+        # Row offset of each (replicate, timepoint) pair in the order of the data
+        self.dt_row_offsets = np.concatenate([self.ndts_bias[ridx] + self.replicate_bias[ridx] \
+            for ridx in range(self.n_replicates)])
 
         # Makes a dictionary that maps the taxon index to the rows that it the  in
-        self.oidx2rows = {}
-        for oidx in range(self.n_taxa):
-            idxs = np.zeros(self.total_dts, dtype=int)
-            i = 0
-            for ridx in range(self.n_replicates):
-                temp = np.arange(0, self.n_dts_for_replicate[ridx] * self.n_taxa, self.n_taxa)
-                temp = temp + oidx
-                temp = temp + self.replicate_bias[ridx]
-                l = len(temp)
-                idxs[i:i+l] = temp
-                i += l
-            self.oidx2rows[oidx] = idxs
+        self.oidx2rows = {oidx: self.dt_row_offsets + oidx for oidx in range(self.n_taxa)}
 
     def add_trace(self):
         self.value = self.G[STRNAMES.INTERACTIONS_OBJ].get_datalevel_indicator_matrix()
@@ -4565,36 +5399,20 @@ class ClusterInteractionIndicators(pl.variables.Variable):
         '''Creates a dictionary that maps the cluster id to the
         rows that correspond to each Taxa in the cluster.
 
-        We cannot cast this with numba because it does not support Fortran style
-        raveling :(.
-
         Returns
         -------
         dict: int -> np.ndarray
             Maps the cluster ID to the row indices corresponding to it
         '''
-        clusters = [np.asarray(oidxs, dtype=int).reshape(-1,1) \
+        clusters = [np.asarray(oidxs, dtype=int) \
             for oidxs in self.clustering.tolistoflists()]
 
         d = {}
         cids = self.clustering.order
 
         for cidx,cid in enumerate(cids):
-            a = np.zeros(len(clusters[cidx]) * self.total_dts, dtype=int)
-            i = 0
-            for ridx in range(self.n_replicates):
-                idxs = np.zeros(
-                    (len(clusters[cidx]),
-                    self.n_dts_for_replicate[ridx]), int)
-                idxs = idxs + clusters[cidx]
-                idxs = idxs + self.ndts_bias[ridx]
-                idxs = idxs + self.replicate_bias[ridx]
-                idxs = idxs.ravel('F')
-                l = len(idxs)
-                a[i:i+l] = idxs
-                i += l
-
-            d[cid] = a
+            # Rows are ordered by replicate, then timepoint, then taxon
+            d[cid] = (self.dt_row_offsets.reshape(-1,1) + clusters[cidx]).ravel()
 
         if self.G.data.zero_inflation_transition_policy is not None:
             # We need to convert the indices that are meant from no zero inflation to
@@ -4606,15 +5424,8 @@ class ClusterInteractionIndicators(pl.variables.Variable):
             rows_to_include = self.G.data.rows_to_include_zero_inflation
             for cid in d:
                 arr = d[cid]
-                new_arr = np.zeros(len(arr), dtype=int)
-                n = 0
-                for idx in arr:
-                    if rows_to_include[idx]:
-                        new_arr[n] = idx - prevoff_arr[idx]
-                        n += 1
-
-                new_arr = new_arr[:n]
-                d[cid] = new_arr
+                arr = arr[rows_to_include[arr]]
+                d[cid] = arr - prevoff_arr[arr]
         return d
 
     # @profile
@@ -4635,11 +5446,15 @@ class ClusterInteractionIndicators(pl.variables.Variable):
               that corresponds to the target cluster (only the Taxa in the target
               cluster). This is a 1D array that corresponds to the diagonal of what
               would be the precision matrix.
+        - sqrt_ys : dict (int -> np.ndarray)
+            - `ys` with each row scaled by the square root of its process precision
         - interactionXs : dict (int -> np.ndarray)
             - Maps the target cluster id to the matrix of the design matrix of the
               interactions. Only includes the rows that correspond to the Taxa in the
               target cluster. It includes every single column as if all of the indicators
               are on. We only index out the columns when we are doing the marginalization.
+              Each row is scaled by the square root of its process precision so that
+              `X.T @ process_prec @ X` is a symmetric rank-k update of the scaled matrix.
         - prior_prec_interaction : float
             - Prior precision of the interaction value. We then use this
               value to make the diagonal of the prior precision.
@@ -4692,14 +5507,20 @@ class ClusterInteractionIndicators(pl.variables.Variable):
         process_prec_diag = self.G[STRNAMES.PROCESSVAR].prec
         for tcid in self.clustering.order:
             self.process_precs[tcid] = process_prec_diag[row_idxs[tcid]]
+        sqrt_process_precs = {tcid: np.sqrt(self.process_precs[tcid]) \
+            for tcid in self.clustering.order}
+        self.sqrt_ys = {tcid: self.ys[tcid] * sqrt_process_precs[tcid][:, None] \
+            for tcid in self.clustering.order}
 
         # Make interactionXs
         self.interactionXs = {}
         self.G.data.design_matrices[STRNAMES.CLUSTER_INTERACTION_VALUE].M.build(
             build=True, build_for_neg_ind=True)
-        XM_master = self.G.data.design_matrices[STRNAMES.CLUSTER_INTERACTION_VALUE].toarray()
+        XM_master = self.G.data.design_matrices[STRNAMES.CLUSTER_INTERACTION_VALUE].matrix.tocsr()
         for tcid in self.clustering.order:
-            self.interactionXs[tcid] = XM_master[row_idxs[tcid], :]
+            # Fortran order so that selecting columns copies contiguous memory
+            self.interactionXs[tcid] = _dense_block(XM_master, rows=row_idxs[tcid], order='F')
+            self.interactionXs[tcid] *= sqrt_process_precs[tcid][:, None]
 
         # Make prior parameters
         self.prior_var_interaction = self.G[STRNAMES.PRIOR_VAR_INTERACTIONS].value
@@ -4713,7 +5534,7 @@ class ClusterInteractionIndicators(pl.variables.Variable):
         self.priorvar_logdet = np.log(self.prior_var_interaction)
 
         if self._there_are_perturbations:
-            XMpert_master = self.G.data.design_matrices[STRNAMES.PERT_VALUE].toarray()
+            XMpert_master = self.G.data.design_matrices[STRNAMES.PERT_VALUE].matrix.tocsr()
 
             # Make perturbationsXs
             self.perturbationsXs = {}
@@ -4729,8 +5550,7 @@ class ClusterInteractionIndicators(pl.variables.Variable):
                             i += 1
                 cols = np.asarray(cols, dtype=int)
 
-                self.perturbationsXs[tcid] = pl.util.fast_index(M=XMpert_master,
-                    rows=rows, cols=cols)
+                self.perturbationsXs[tcid] = _dense_block(XMpert_master, rows=rows, cols=cols)
 
             # Make prior perturbation parameters
             self.prior_mean_perturbations = {}
@@ -4755,6 +5575,29 @@ class ClusterInteractionIndicators(pl.variables.Variable):
                     perturbation.indicator.num_on_clusters() * \
                     perturbation.magnitude.prior.scale2.value
 
+        # Make the scratch buffers for the transposed design matrix and the prior
+        # parameters. The perturbations (fixed for each target cluster) go first,
+        # then the interactions into the target cluster
+        self.XT_scratch = {}
+        self.prior_mean_scratch = {}
+        self.prior_prec_scratch = {}
+        n_clusters = len(self.clustering)
+        for tcid in self.clustering.order:
+            n_rows = len(row_idxs[tcid])
+            n_perts = 0
+            if self._there_are_perturbations:
+                n_perts = self.perturbationsXs[tcid].shape[1]
+            XT = np.empty((n_perts + n_clusters, n_rows))
+            prior_mean = np.full(n_perts + n_clusters, self.prior_mean_interaction, dtype=float)
+            prior_prec = np.full(n_perts + n_clusters, self.prior_prec_interaction, dtype=float)
+            if self._there_are_perturbations:
+                XT[:n_perts] = self.perturbationsXs[tcid].T * sqrt_process_precs[tcid]
+                prior_mean[:n_perts] = self.prior_mean_perturbations[tcid]
+                prior_prec[:n_perts] = self.prior_prec_perturbations[tcid]
+            self.XT_scratch[tcid] = XT
+            self.prior_mean_scratch[tcid] = prior_mean
+            self.prior_prec_scratch[tcid] = prior_prec
+
     # @profile
     def update_relative(self):
         '''Update the indicators variables by calculating the relative loglikelihoods
@@ -4827,23 +5670,20 @@ class ClusterInteractionIndicators(pl.variables.Variable):
 
         # Calculate the posterior
         beta_prec = X.T @ process_prec @ X + prior_prec
-        beta_cov = pinv(beta_prec, self)
-        beta_mean = beta_cov @ ( X.T @ process_prec @ y + prior_prec @ prior_mean )
-        beta_mean = np.asarray(beta_mean).reshape(-1,1)
 
         # Perform the marginalization
         try:
-            beta_logdet = log_det(beta_cov, self)
+            beta_logdet, bEb = _marginal_logdet_and_quadratic(prec=beta_prec,
+                rhs=X.T @ process_prec @ y + prior_prec @ prior_mean, var=self)
         except:
             logger.critical('Crashed in log_det')
-            logger.critical('beta_cov:\n{}'.format(beta_cov))
             logger.critical('prior_prec\n{}'.format(prior_prec))
             raise
         priorvar_logdet = log_det(prior_var, self)
         ll2 = 0.5 * (beta_logdet - priorvar_logdet)
 
         a = np.asarray(prior_mean.T @ prior_prec @ prior_mean)[0,0]
-        b = np.asarray(beta_mean.T @ beta_prec @ beta_mean)[0,0]
+        b = bEb
         ll3 = -0.5 * (a  - b)
 
         return {'ret': ll2+ll3, 'beta_logdet': beta_logdet, 'priorvar_logdet': priorvar_logdet,
@@ -4875,94 +5715,77 @@ class ClusterInteractionIndicators(pl.variables.Variable):
             self.num_pos_indicators += 1
             self.num_neg_indicators -= 1
 
-        d_on = self.calculate_relative_marginal_loglikelihood(idx=idx, val=True)
+        d_on, d_off = self.calculate_relative_marginal_loglikelihoods(idx=idx)
 
         self.n_on_master -= 1
         self.num_pos_indicators -= 1
         self.num_neg_indicators += 1
-        d_off = self.calculate_relative_marginal_loglikelihood(idx=idx, val=False)
 
         ll_on = d_on + self.prior_ll_on
         ll_off = d_off + self.prior_ll_off
 
-        dd = [ll_off, ll_on]
-        res = bool(sample_categorical_log(dd))
+        res = sample_bernoulli_logit(ll_on - ll_off)
         if res:
             self.n_on_master += 1
             self.num_pos_indicators += 1
             self.num_neg_indicators -= 1
             self.curr_interaction.indicator = True
 
-    def calculate_relative_marginal_loglikelihood(self, idx: int, val: bool) -> float:
+    def calculate_relative_marginal_loglikelihoods(self, idx: int) -> Tuple[float, float]:
         '''Calculate the relative marginal log likelihood for the interaction index
-        `idx` with the indicator `val`
+        `idx` with the indicator on and off
+
+        The interaction being sampled is put in the last column so that both are
+        calculated from a single Cholesky factorization.
 
         Parameters
         ----------
         idx : int
             This is the index of the interaction
-        val : bool
-            This is the value to calculate it as
+
+        Returns
+        -------
+        float, float
+            Relative marginal log likelihood with the indicator on, then off
         '''
         tcid = self.curr_interaction.target_cid
 
-        y = self.ys[tcid]
-        process_prec = self.process_precs[tcid]
-
-        # Make X, prior mean, and prior_var
-        if val:
-            cols = np.append(self.col_idxs, idx)
-        else:
-            cols = self.col_idxs
-
-        X = self.interactionXs[tcid][:, cols]
-        prior_mean = np.full(len(cols), self.prior_mean_interaction)
-        prior_prec_diag = np.full(len(cols), self.prior_prec_interaction)
+        sqrt_y = self.sqrt_ys[tcid]
 
+        # Fill the transposed X with the perturbations (already there), the positive
+        # interactions and then the interaction that we are sampling
+        n_perts = 0
         if self._there_are_perturbations:
-            Xpert = self.perturbationsXs[tcid]
-            X = np.hstack((X, Xpert))
-
-            prior_mean = np.append(
-                prior_mean,
-                self.prior_mean_perturbations[tcid])
-
-            prior_prec_diag = np.append(
-                prior_prec_diag,
-                self.prior_prec_perturbations[tcid])
-
-        if X.shape[1] == 0:
-            return 0
-
-        prior_prec = np.diag(prior_prec_diag)
-        pm = (prior_prec_diag * prior_mean).reshape(-1,1)
-
-        # Do the marginalization
-        a = X.T * process_prec
-
-        beta_prec = (a @ X) + prior_prec
-        beta_cov = pinv(beta_prec, self)
-        beta_mean = beta_cov @ ((a @ y) + pm )
-
-        bEb = (beta_mean.T @ beta_prec @ beta_mean)[0,0]
+            n_perts = self.perturbationsXs[tcid].shape[1]
+        n_cols = n_perts + len(self.col_idxs) + 1
+        XinterT = self.interactionXs[tcid].T
+        XT = self.XT_scratch[tcid][:n_cols]
+        np.take(XinterT, self.col_idxs, axis=0, out=XT[n_perts:n_cols-1])
+        XT[-1] = XinterT[idx]
+        prior_mean = self.prior_mean_scratch[tcid][:n_cols]
+        prior_prec_diag = self.prior_prec_scratch[tcid][:n_cols]
+
+        # Do the marginalization. The rows of X and y are already scaled by the square
+        # root of the process precision so `X.T @ process_prec @ X` is a symmetric
+        # rank-k update, of which we only compute the lower triangle
+        beta_prec = scipy.linalg.blas.dsyrk(1., XT.T, trans=1, lower=1)
+        beta_prec[np.diag_indices_from(beta_prec)] += prior_prec_diag
         try:
-            beta_logdet = log_det(beta_cov, self)
+            (beta_logdet_on, bEb_on), (beta_logdet_off, bEb_off) = \
+                _marginal_logdet_and_quadratic_on_off(prec=beta_prec,
+                    rhs=(XT @ sqrt_y).ravel() + prior_prec_diag * prior_mean, var=self)
         except:
             logger.critical('Crashed in log_det')
-            logger.critical('beta_cov:\n{}'.format(beta_cov))
-            logger.critical('prior_prec\n{}'.format(prior_prec))
+            logger.critical('prior_prec_diag\n{}'.format(prior_prec_diag))
             raise
 
-        if val:
-            bEbprior = (self.prior_mean_interaction**2)/self.prior_var_interaction
-            priorvar_logdet = self.priorvar_logdet
-        else:
-            bEbprior = 0
-            priorvar_logdet = 0
-
-        ll2 = 0.5 * (beta_logdet - priorvar_logdet)
-        ll3 = 0.5 * (bEb - bEbprior)
-        return ll2 + ll3
+        bEbprior = (self.prior_mean_interaction**2)/self.prior_var_interaction
+        ll_on = 0.5 * (beta_logdet_on - self.priorvar_logdet) + 0.5 * (bEb_on - bEbprior)
+        if n_cols == 1:
+            # No columns when the indicator is off
+            return ll_on, 0
+        ll_off = 0.5 * beta_logdet_off + 0.5 * bEb_off
+        return ll_on, ll_off
 
     def kill(self):
         pass
@@ -4992,6 +5815,8 @@ class ClusterInteractionIndicators(pl.variables.Variable):
             have identical values, so we can choose any taxon within the cluster to
             represent it
         '''
+        from . import visualization
+        import matplotlib.pyplot as plt
         from . util import generate_interation_bayes_factors_posthoc
 
         if not self.G.inference.tracer.is_being_traced(self.G[STRNAMES.INTERACTIONS_OBJ]):
@@ -5368,7 +6193,7 @@ class PriorVarMH(pl.variables.SICS):
 
         # Accept or reject
         r = (new_target_ll - prev_target_ll) + (prev_prop_ll - new_prop_ll)
-        u = np.log(pl.random.misc.fast_sample_standard_uniform())
+        u = -pl.random.misc.fast_sample_standard_exponential()
 
         if r >= u:
             self.acceptances[self.sample_iter] = True
@@ -5397,6 +6222,8 @@ class PriorVarMH(pl.variables.SICS):
         -------
         pandas.DataFrame
         '''
+        from . import visualization
+        import matplotlib.pyplot as plt
         if not self.G.inference.tracer.is_being_traced(self):
             logger.info('`{}` not learned\n\tValue: {}\n'.format(self.name, self.value))
             return pd.DataFrame()
@@ -5812,7 +6639,7 @@ class PriorMeanMH(pl.variables.TruncatedNormal):
 
         # Accept or reject
         r = (new_target_ll - prev_target_ll) + (prev_prop_ll - new_prop_ll)
-        u = np.log(pl.random.misc.fast_sample_standard_uniform())
+        u = -pl.random.misc.fast_sample_standard_exponential()
 
         if r >= u:
             self.acceptances[self.sample_iter] = True
@@ -5841,6 +6668,8 @@ class PriorMeanMH(pl.variables.TruncatedNormal):
         -------
         pandas.DataFrame
         '''
+        from . import visualization
+        import matplotlib.pyplot as plt
         if not self.G.inference.tracer.is_being_traced(self):
             logger.info('`{}` not learned\n\tValue: {}\n'.format(self.name, self.value))
             return pd.DataFrame()
@@ -5947,6 +6776,10 @@ class Growth(pl.variables.TruncatedNormal):
             raise ValueError('`delay` ({}) must be >= 0'.format(delay))
         self.delay = delay
         self._n_times_nan = 0
+        self._prior_cache_key = None
+        self._prior_prec = None
+        self._pm = None
+        self._diagonal_posterior = None
 
         # Truncation settings
         if truncation_settings is None:
@@ -5984,7 +6817,7 @@ class Growth(pl.variables.TruncatedNormal):
             raise TypeError('`value_option` ({}) must be a str'.format(type(value_option)))
         if value_option == 'manual':
             if not pl.isarray(value):
-                value = np.ones(len(self.G.data.taxa))*value
+                value = np.full(len(self.G.data.taxa), value, dtype=float)
             if len(value) != self.G.data.n_taxa:
                 raise ValueError('`value` ({}) must be ({}) long'.format(
                     len(value), len(self.G.data.taxa)))
@@ -6000,14 +6833,12 @@ class Growth(pl.variables.TruncatedNormal):
                 index_out_perturbations=True)
             y = self.G.data.construct_lhs(keys=lhs, index_out_perturbations=True)
 
-            prec = X.T @ X
-            cov = pinv(prec, self)
-            least_squares = (cov @ X.transpose().dot(y)).ravel()
+            least_squares = _least_squares(X, y)
             self.value = np.absolute(least_squares[:len(self.G.data.taxa)])
         elif value_option in ['auto', 'ones']:
             self.value = np.ones(len(self.G.data.taxa), dtype=float)
         elif value_option == 'prior-mean':
-            self.value = self.prior.mean() * np.ones(self.G.data.n_taxa)
+            self.value = np.full(self.G.data.n_taxa, self.prior.mean(), dtype=float)
         else:
             raise ValueError('`value_option` ({}) not recognized'.format(value_option))
 
@@ -6025,11 +6856,10 @@ class Growth(pl.variables.TruncatedNormal):
         self.calculate_posterior()
         self.sample()
 
-        if not pl.isarray(self.value):
-            # This will happen if there is 1 Taxa
-            self.value = np.array([self.value])
+        # This will be a scalar if there is 1 Taxa
+        self.value = np.atleast_1d(self.value)
 
-        if np.any(np.isnan(self.value)):
+        if np.isnan(np.sum(self.value)):
             if self._n_times_nan > 5:
                 raise ValueError('Too many nans')
 
@@ -6063,19 +6893,37 @@ class Growth(pl.variables.TruncatedNormal):
         process_prec = self.G[STRNAMES.PROCESSVAR].build_matrix(
             cov=False, sparse=True)
 
-        prior_prec = build_prior_covariance(G=self.G, cov=False,
-            order=rhs, sparse=True)
-        prior_mean = build_prior_mean(G=self.G, order=rhs).reshape(-1,1)
-        pm = prior_prec @ prior_mean
-
-        prec = X.T @ process_prec @ X + prior_prec
-        cov = pinv(prec, self)
-
-        self.loc.value = np.asarray(cov @ (X.T @ process_prec.dot(y) + pm)).ravel()
-        self.scale2.value = np.diag(cov)
+        # The prior only changes when its hyperparameters are resampled
+        prior_key = (self.prior.loc.value, self.prior.scale2.value)
+        if prior_key != self._prior_cache_key:
+            prior_prec = build_prior_covariance(G=self.G, cov=False,
+                order=rhs, sparse=True)
+            prior_mean = build_prior_mean(G=self.G, order=rhs).reshape(-1,1)
+            self._prior_prec = prior_prec
+            self._pm = prior_prec @ prior_mean
+            self._prior_cache_key = prior_key
+        prior_prec = self._prior_prec
+        pm = self._pm
+
+        # Each row of `X` has a single nonzero and both precisions are diagonal, so
+        # the posterior precision is diagonal and we never need the dense inverse.
+        # The structure of the matrices is fixed so we only check it once
+        if self._diagonal_posterior is None:
+            self._diagonal_posterior = _has_diagonal_normal_equations(X=X,
+                process_prec=process_prec, prior_prec=prior_prec)
+        if self._diagonal_posterior:
+            prec_diag, mean_rhs = _diagonal_normal_equations(X=X,
+                process_prec=process_prec, y=y, prior_prec=prior_prec, pm=pm)
+            self.scale2.value = 1/prec_diag
+            self.loc.value = mean_rhs * self.scale2.value
+        else:
+            prec = X.T @ process_prec @ X + prior_prec
+            mean_rhs = np.ravel(X.T @ process_prec.dot(y) + pm)
+            self.loc.value, self.scale2.value = _posterior_mean_and_variance(
+                prec=prec, rhs=mean_rhs, var=self)
 
     def visualize(self, basepath: str, section: str='posterior', taxa_formatter: str='%(name)s',
-        true_value: np.ndarray=None) -> pd.DataFrame:
+        true_value: np.ndarray=None, n_cpus: int=1) -> pd.DataFrame:
         '''Render the traces in the folder `basepath`. Makes a `pandas.DataFrame` table
         where the index is the Taxa name in `taxa_formatter` and the columns are
         `mean`, `median`, `25th percentile`, `75th` percentile`.
@@ -6094,6 +6942,9 @@ class Growth(pl.variables.TruncatedNormal):
             the taxa name
         true_value : np.ndarray
             Ground truth values of the variable
+        n_cpus : int
+            Number of processes to render the taxa with. If 1, everything is rendered
+            in the current process
 
         Returns
         -------
@@ -6138,53 +6989,46 @@ class Growth(pl.variables.TruncatedNormal):
             prior_mean_trace = self.G[STRNAMES.PRIOR_MEAN_GROWTH].get_trace_from_disk(
                     section=section)
         else:
-            prior_mean_trace = self.prior.loc.value * np.ones(len_posterior, dtype=float)
+            prior_mean_trace = np.full(len_posterior, self.prior.loc.value, dtype=float)
         if self.G.tracer.is_being_traced(STRNAMES.PRIOR_VAR_GROWTH):
             prior_std_trace = np.sqrt(
                 self.G[STRNAMES.PRIOR_VAR_GROWTH].get_trace_from_disk(section=section))
         else:
-            prior_std_trace = np.sqrt(self.prior.scale2.value) * np.ones(len_posterior, dtype=float)
-
-        for idx in range(len(taxa)):
-            fig = plt.figure()
-            ax_posterior = fig.add_subplot(1,2,1)
-            visualization.render_trace(var=self, idx=idx, plt_type='hist',
-                label=section, color='blue', ax=ax_posterior, section=section,
-                include_burnin=True, rasterized=True)
-
-            # Get the limits and only look at the posterior within 20% range +- of
-            # this number
-            low_x, high_x = ax_posterior.get_xlim()
-
-            arr = np.zeros(len(prior_std_trace), dtype=float)
-            for i in range(len(prior_std_trace)):
-                arr[i] = pl.random.truncnormal.sample(loc=prior_mean_trace[i], scale=prior_std_trace[i],
-                    low=self.low, high=self.high)
-            visualization.render_trace(var=arr, plt_type='hist',
-                label='prior', color='red', ax=ax_posterior, rasterized=True)
-
-            if true_value is not None:
-                ax_posterior.axvline(x=true_value[idx], color='red', alpha=0.65,
-                    label='True Value')
-
-            ax_posterior.legend()
-            ax_posterior.set_xlim(left=low_x*.8, right=high_x*1.2)
-
-            # plot the trace
-            ax_trace = fig.add_subplot(1,2,2)
-            visualization.render_trace(var=self, idx=idx, plt_type='trace',
-                ax=ax_trace, section=section, include_burnin=True, rasterized=True)
-
-            if true_value is not None:
-                ax_trace.axhline(y=true_value[idx], color='red', alpha=0.65,
-                    label='True Value')
-                ax_trace.legend()
-
-            fig.suptitle('{}'.format(index[idx]))
-            fig.tight_layout()
-            fig.subplots_adjust(top=0.85)
-            plt.savefig(os.path.join(basepath, '{}.pdf'.format(taxa[idx].name)))
-            plt.close()
+            prior_std_trace = np.full(len_posterior, np.sqrt(self.prior.scale2.value), dtype=float)
+
+        # The prior does not depend on the taxon so we only sample it once
+        prior_samples = scipy.stats.truncnorm.rvs(
+            a=(self.low - prior_mean_trace)/prior_std_trace,
+            b=(self.high - prior_mean_trace)/prior_std_trace,
+            loc=prior_mean_trace, scale=prior_std_trace)
+
+        # Read the traces once and render each taxon from the arrays
+        posterior_trace = self.get_trace_from_disk(
+            section='posterior' if section == 'entire' else section)
+        if section == 'burnin':
+            trace = posterior_trace
+        else:
+            trace = np.append(self.get_trace_from_disk(section='burnin'),
+                posterior_trace, axis=0)
+        n_burnin = len(trace) - len(posterior_trace) if section != 'burnin' else len(trace)
+
+        if n_cpus is None or n_cpus <= 1:
+            _render_taxa_posteriors(basepath=basepath, names=index,
+                posterior_trace=posterior_trace, trace=trace, n_burnin=n_burnin,
+                prior_samples=prior_samples, true_value=true_value, section=section)
+        else:
+            # Each process only gets the columns of the taxa that it renders
+            args = []
+            for idxs in np.array_split(np.arange(len(taxa)), n_cpus):
+                if len(idxs) == 0:
+                    continue
+                args.append((
+                    basepath, [index[idx] for idx in idxs], posterior_trace[:, idxs],
+                    trace[:, idxs], n_burnin, prior_samples,
+                    None if true_value is None else np.asarray(true_value)[idxs],
+                    section))
+            with multiprocessing.Pool(n_cpus) as pool:
+                pool.starmap(_render_taxa_posteriors, args)
 
         return df
 
@@ -6276,6 +7120,10 @@ class SelfInteractions(pl.variables.TruncatedNormal):
             raise ValueError('`delay` ({}) must be >= 0'.format(delay))
         self.delay = delay
         self._n_times_nan = 0
+        self._prior_cache_key = None
+        self._prior_prec = None
+        self._pm = None
+        self._diagonal_posterior = None
 
         # Set truncation settings
         if pl.isstr(truncation_settings):
@@ -6332,7 +7180,7 @@ class SelfInteractions(pl.variables.TruncatedNormal):
             raise TypeError('`value_option` ({}) must be a str'.format(type(value_option)))
         if value_option == 'manual':
             if not pl.isarray(value):
-                value = np.ones(len(self.G.data.taxa))*value
+                value = np.full(len(self.G.data.taxa), value, dtype=float)
             if len(value) != self.G.data.n_taxa:
                 raise ValueError('`value` ({}) must be ({}) long'.format(
                     len(value), len(self.G.data.taxa)))
@@ -6343,9 +7191,7 @@ class SelfInteractions(pl.variables.TruncatedNormal):
             y = self.G.data.construct_lhs(keys=[STRNAMES.GROWTH_VALUE], kwargs_dict={
                 STRNAMES.GROWTH_VALUE:{'with_perturbations':False}},
                 index_out_perturbations=True)
-            prec = X.T @ X
-            cov = pinv(prec, self)
-            self.value = np.absolute((cov @ X.transpose().dot(y)).ravel())
+            self.value = np.absolute(_least_squares(X, y))
         elif 'strict-enforcement' in value_option:
             if 'full' in value_option:
                 rhs = [STRNAMES.SELF_INTERACTION_VALUE]
@@ -6360,12 +7206,10 @@ class SelfInteractions(pl.variables.TruncatedNormal):
                 index_out_perturbations=True)
             y = self.G.data.construct_lhs(keys=lhs, index_out_perturbations=True)
 
-            prec = X.T @ X
-            cov = pinv(prec, self)
-            mean = (cov @ X.transpose().dot(y)).ravel()
+            mean = _least_squares(X, y)
             self.value = np.absolute(mean[len(self.G.data.taxa):])
         elif value_option == 'prior-mean':
-            self.value = self.prior.loc.value * np.ones(self.G.data.n_taxa)
+            self.value = np.full(self.G.data.n_taxa, self.prior.loc.value, dtype=float)
         elif value_option in ['steady-state', 'auto']:
             # check quantile
             if not pl.isnumeric(q):
@@ -6407,10 +7251,7 @@ class SelfInteractions(pl.variables.TruncatedNormal):
             y = self.G.data.construct_lhs(keys=lhs, index_out_perturbations=True,
                 kwargs_dict={STRNAMES.GROWTH_VALUE:{'with_perturbations':False}})
 
-            prec = X.T @ X
-            cov = pinv(prec, self)
-            least_squares = cov @ X.T @ y
-            self.value = np.asarray(least_squares).ravel()
+            self.value = _least_squares(X, y)
         else:
             raise ValueError('`value_option` ({}) not recognized'.format(value_option))
 
@@ -6425,11 +7266,10 @@ class SelfInteractions(pl.variables.TruncatedNormal):
         self.calculate_posterior()
         self.sample()
 
-        if not pl.isarray(self.value):
-            # This will happen if there is 1 Taxa
-            self.value = np.array([self.value])
+        # This will be a scalar if there is 1 Taxa
+        self.value = np.atleast_1d(self.value)
 
-        if np.any(np.isnan(self.value)):
+        if np.isnan(np.sum(self.value)):
             if self._n_times_nan > 5:
                 raise ValueError('Too many nans')
 
@@ -6456,18 +7296,37 @@ class SelfInteractions(pl.variables.TruncatedNormal):
                 'with_perturbations':self._there_are_perturbations}})
         process_prec = self.G[STRNAMES.PROCESSVAR].build_matrix(
             cov=False, sparse=True)
-        prior_prec = build_prior_covariance(G=self.G, cov=False,
-            order=rhs, sparse=True)
-
-        pm = prior_prec @ (self.prior.loc.value * np.ones(self.G.data.n_taxa).reshape(-1,1))
 
-        prec = X.T @ process_prec @ X + prior_prec
-        cov = pinv(prec, self)
-        self.loc.value = np.asarray(cov @ (X.T @ process_prec.dot(y) + pm)).ravel()
-        self.scale2.value = np.diag(cov)
+        # The prior only changes when its hyperparameters are resampled
+        prior_key = (self.prior.loc.value, self.prior.scale2.value)
+        if prior_key != self._prior_cache_key:
+            prior_prec = build_prior_covariance(G=self.G, cov=False,
+                order=rhs, sparse=True)
+            self._prior_prec = prior_prec
+            self._pm = prior_prec @ np.full((self.G.data.n_taxa, 1), self.prior.loc.value)
+            self._prior_cache_key = prior_key
+        prior_prec = self._prior_prec
+        pm = self._pm
+
+        # Each row of `X` has a single nonzero and both precisions are diagonal, so
+        # the posterior precision is diagonal and we never need the dense inverse.
+        # The structure of the matrices is fixed so we only check it once
+        if self._diagonal_posterior is None:
+            self._diagonal_posterior = _has_diagonal_normal_equations(X=X,
+                process_prec=process_prec, prior_prec=prior_prec)
+        if self._diagonal_posterior:
+            prec_diag, mean_rhs = _diagonal_normal_equations(X=X,
+                process_prec=process_prec, y=y, prior_prec=prior_prec, pm=pm)
+            self.scale2.value = 1/prec_diag
+            self.loc.value = mean_rhs * self.scale2.value
+        else:
+            prec = X.T @ process_prec @ X + prior_prec
+            mean_rhs = np.ravel(X.T @ process_prec.dot(y) + pm)
+            self.loc.value, self.scale2.value = _posterior_mean_and_variance(
+                prec=prec, rhs=mean_rhs, var=self)
 
     def visualize(self, basepath: str, section: str='posterior', taxa_formatter: str='%(name)s',
-        true_value: np.ndarray=None) -> pd.DataFrame:
+        true_value: np.ndarray=None, n_cpus: int=1) -> pd.DataFrame:
         '''Render the traces in the folder `basepath`. Makes a `pandas.DataFrame` table
         where the index is the Taxa name in `taxa_formatter` and the columns are
         `mean`, `median`, `25th percentile`, `75th` percentile`.
@@ -6486,6 +7345,9 @@ class SelfInteractions(pl.variables.TruncatedNormal):
             the taxon's name
         true_value : np.ndarray
             Ground truth values of the variable
+        n_cpus : int
+            Number of processes to render the taxa with. If 1, everything is rendered
+            in the current process
 
         Returns
         -------
@@ -6526,53 +7388,46 @@ class SelfInteractions(pl.variables.TruncatedNormal):
             prior_mean_trace = self.G[STRNAMES.PRIOR_MEAN_GROWTH].get_trace_from_disk(
                     section=section)
         else:
-            prior_mean_trace = self.prior.loc.value * np.ones(len_posterior, dtype=float)
+            prior_mean_trace = np.full(len_posterior, self.prior.loc.value, dtype=float)
         if self.G.tracer.is_being_traced(STRNAMES.PRIOR_VAR_GROWTH):
             prior_std_trace = np.sqrt(
                 self.G[STRNAMES.PRIOR_VAR_GROWTH].get_trace_from_disk(section=section))
         else:
-            prior_std_trace = np.sqrt(self.prior.scale2.value) * np.ones(len_posterior, dtype=float)
-
-        for idx in range(len(taxa)):
-            fig = plt.figure()
-            ax_posterior = fig.add_subplot(1,2,1)
-            visualization.render_trace(var=self, idx=idx, plt_type='hist',
-                label=section, color='blue', ax=ax_posterior, section=section,
-                include_burnin=True, rasterized=True)
-
-            # Get the limits and only look at the posterior within 20% range +- of
-            # this number
-            low_x, high_x = ax_posterior.get_xlim()
-
-            arr = np.zeros(len(prior_std_trace), dtype=float)
-            for i in range(len(prior_std_trace)):
-                arr[i] = pl.random.truncnormal.sample(loc=prior_mean_trace[i], scale=prior_std_trace[i],
-                    low=self.low, high=self.high)
-            visualization.render_trace(var=arr, plt_type='hist',
-                label='prior', color='red', ax=ax_posterior, rasterized=True)
-
-            if true_value is not None:
-                ax_posterior.axvline(x=true_value[idx], color='red', alpha=0.65,
-                    label='True Value')
-
-            ax_posterior.legend()
-            ax_posterior.set_xlim(left=low_x*.8, right=high_x*1.2)
-
-            # plot the trace
-            ax_trace = fig.add_subplot(1,2,2)
-            visualization.render_trace(var=self, idx=idx, plt_type='trace',
-                ax=ax_trace, section=section, include_burnin=True, rasterized=True)
-
-            if true_value is not None:
-                ax_trace.axhline(y=true_value[idx], color='red', alpha=0.65,
-                    label='True Value')
-                ax_trace.legend()
-
-            fig.suptitle('{}'.format(index[idx]))
-            fig.tight_layout()
-            fig.subplots_adjust(top=0.85)
-            plt.savefig(os.path.join(basepath, '{}.pdf'.format(taxa[idx].name)))
-            plt.close()
+            prior_std_trace = np.full(len_posterior, np.sqrt(self.prior.scale2.value), dtype=float)
+
+        # The prior does not depend on the taxon so we only sample it once
+        prior_samples = scipy.stats.truncnorm.rvs(
+            a=(self.low - prior_mean_trace)/prior_std_trace,
+            b=(self.high - prior_mean_trace)/prior_std_trace,
+            loc=prior_mean_trace, scale=prior_std_trace)
+
+        # Read the traces once and render each taxon from the arrays
+        posterior_trace = self.get_trace_from_disk(
+            section='posterior' if section == 'entire' else section)
+        if section == 'burnin':
+            trace = posterior_trace
+        else:
+            trace = np.append(self.get_trace_from_disk(section='burnin'),
+                posterior_trace, axis=0)
+        n_burnin = len(trace) - len(posterior_trace) if section != 'burnin' else len(trace)
+
+        if n_cpus is None or n_cpus <= 1:
+            _render_taxa_posteriors(basepath=basepath, names=index,
+                posterior_trace=posterior_trace, trace=trace, n_burnin=n_burnin,
+                prior_samples=prior_samples, true_value=true_value, section=section)
+        else:
+            # Each process only gets the columns of the taxa that it renders
+            args = []
+            for idxs in np.array_split(np.arange(len(taxa)), n_cpus):
+                if len(idxs) == 0:
+                    continue
+                args.append((
+                    basepath, [index[idx] for idx in idxs], posterior_trace[:, idxs],
+                    trace[:, idxs], n_burnin, prior_samples,
+                    None if true_value is None else np.asarray(true_value)[idxs],
+                    section))
+            with multiprocessing.Pool(n_cpus) as pool:
+                pool.starmap(_render_taxa_posteriors, args)
 
         return df
 
@@ -6595,6 +7450,14 @@ class GLVParameters(pl.variables.MVN):
     pert_mag : PerturbationMagnitudes, None
         These are the magnitudes of the perturbation parameters (per clsuter)
         Set to None if there are no perturbations
+
+    Notes
+    -----
+    `mean` is the posterior mean of the last joint update of the interactions and
+    perturbations. It is None after an update with the conjugate gradient sampler,
+    which draws the sample without solving for the mean. `cov` is only set when the
+    posterior precision is not positive definite and the update falls back to `pinv`.
+    Otherwise it is None.
     '''
     def __init__(self, growth: Growth, self_interactions: SelfInteractions,
         interactions: ClusterInteractionValue, pert_mag: "PerturbationMagnitudes", **kwargs):
@@ -6690,10 +7553,12 @@ class GLVParameters(pl.variables.MVN):
     def asarray(self) -> np.ndarray:
         '''Builds the full regression coefficient vector.
         '''
-        # build the entire thing
-        a = np.append(self.growth.value, self.self_interactions.value)
-        a = np.append(a, self.interactions.obj.get_values(use_indicators=True))
-        return a
+        n = self.n_taxa
+        a = np.empty(2*n + self.interactions.obj.size, dtype=float)
+        a[:n] = self.growth.value
+        a[n:2*n] = self.self_interactions.value
+        k = len(self.interactions.obj.get_values(use_indicators=True, out=a[2*n:]))
+        return a[:2*n+k]
 
     def update(self):
         '''Either updated jointly using multivariate normal or update independently
@@ -6703,7 +7568,10 @@ class GLVParameters(pl.variables.MVN):
         '''
         self._update_perts_and_inter()
         if self._there_are_perturbations:
-            self.G.data.design_matrices[STRNAMES.GROWTH_VALUE].build_with_perturbations()
+            # Only rebuild if the perturbations changed since the last build
+            growth_dm = self.G.data.design_matrices[STRNAMES.GROWTH_VALUE]
+            if growth_dm.perturbations_dirty:
+                growth_dm.build_with_perturbations()
 
         # Update growth and self-interactions
         self._update_growth_and_selfinter()
@@ -6789,7 +7657,7 @@ class GLVParameters(pl.variables.MVN):
                     proposal_si = taxa_proposal[1]
 
                     r = (taxa_new_target_ll - taxa_prev_target_ll) + (taxa_prev_prop_ll - taxa_new_prop_ll)
-                    u = np.log(pl.random.misc.fast_sample_standard_uniform())
+                    u = -pl.random.misc.fast_sample_standard_exponential()
                     if r >= u:
                         _growth.value[taxa_id] = proposal_growth
                         _self_int.value[taxa_id] = proposal_si
@@ -6847,16 +7715,16 @@ class GLVParameters(pl.variables.MVN):
             together
         '''
         if not self.update_jointly_pert_inter:
-            # Update separately
-            # -----------------
-            if pl.random.misc.fast_sample_standard_uniform() < 0.5:
-                self.G[STRNAMES.CLUSTER_INTERACTION_VALUE].update()
-                if self._there_are_perturbations:
-                    self.G[STRNAMES.PERT_VALUE].update()
-            else:
-                if self._there_are_perturbations:
-                    self.G[STRNAMES.PERT_VALUE].update()
-                self.G[STRNAMES.CLUSTER_INTERACTION_VALUE].update()
+            # Update separately in a random order
+            # -----------------------------------
+            if not self._there_are_perturbations:
+                self.interactions.update()
+                return
+            first, second = self.interactions, self.pert_mag
+            if pl.random.misc.fast_sample_standard_uniform() >= 0.5:
+                first, second = second, first
+            first.update()
+            second.update()
         else:
             # Update jointly
             # --------------
@@ -6885,25 +7753,61 @@ class GLVParameters(pl.variables.MVN):
 
             process_prec = self.G[STRNAMES.PROCESSVAR].build_matrix(
                 cov=False, sparse=True)
+            # The prior precision is diagonal so only keep the diagonal
             prior_prec = build_prior_covariance(G=self.G, cov=False,
-                order=rhs, sparse=True)
-            prior_means = build_prior_mean(G=self.G,order=rhs).reshape(-1,1)
-
-            # Make the prior covariance matrix and process varaince
-            prec = X.T @ process_prec @ X + prior_prec
-            self.cov.value = pinv(prec, self)
-            self.mean.value = np.asarray(self.cov.value @ (X.T @ process_prec.dot(y) + \
-                prior_prec @ prior_means)).ravel()
+                order=rhs, diag=True)
+            prior_means = build_prior_mean(G=self.G,order=rhs)
 
             # sample posterior jointly and then assign the values to each coefficient
             # type, respectfully
-            try:
-                value = self.sample()
-            except:
-                logger.critical('failed here, updating separately')
-                self.pert_mag.update()
-                self.interactions.update()
-                return
+            process_diag = None
+            if _is_diagonal(process_prec):
+                process_diag = process_prec.diagonal()
+            if process_diag is not None and X.shape[1] >= _CG_SAMPLER_MIN_DIM:
+                # Large system - only use matrix-vector products of the precision
+                b = np.ravel(X.T @ (process_diag * np.ravel(y))) + prior_prec * prior_means
+                value = _sample_gaussian_cg(X=X, process_prec=process_prec,
+                    prior_prec=prior_prec, b=b)
+                self.mean.value = None
+                self.cov.value = None
+                self.value = value
+            else:
+                # Make the posterior precision and the right hand side of the mean
+                if process_diag is not None:
+                    X = scipy.sparse.csr_matrix(X)
+                    prec = np.zeros((X.shape[1], X.shape[1]), dtype=float)
+                    b = np.zeros(X.shape[1], dtype=float)
+                    _assemble_normal_equations(X.data, X.indices, X.indptr,
+                        process_diag, np.ravel(y).astype(float), prior_prec,
+                        prior_means, prec, b)
+                else:
+                    # `process_prec` is symmetric so `Xw.T` is `X.T @ process_prec`
+                    Xw = process_prec @ X
+                    b = np.ravel(Xw.T @ y) + prior_prec * prior_means
+                    prec = Xw.T @ X
+                    if scipy.sparse.issparse(prec):
+                        prec = prec.toarray()
+                    prec[np.diag_indices_from(prec)] += prior_prec
+                try:
+                    # The precision is symmetric positive definite so we can sample using
+                    # its Cholesky factor instead of forming the covariance
+                    L = scipy.linalg.cholesky(prec, lower=True, overwrite_a=True,
+                        check_finite=False)
+                    self.mean.value = scipy.linalg.cho_solve((L, True), b, check_finite=False)
+                    self.cov.value = None
+                    value = self.mean.value + scipy.linalg.solve_triangular(L,
+                        npr.standard_normal(len(b)), lower=True, trans='T',
+                        check_finite=False)
+                    self.value = value
+                except np.linalg.LinAlgError:
+                    self.cov.value = pinv(prec, self)
+                    self.mean.value = self.cov.value @ b
+                    try:
+                        value = self.sample()
+                    except:
+                        logger.critical('failed here, updating separately')
+                        self._update_perts_and_inter_separately(X=X, y=y, rhs=rhs)
+                        return
 
             i = 0
             if STRNAMES.CLUSTER_INTERACTION_VALUE in rhs:
@@ -6917,9 +7821,42 @@ class GLVParameters(pl.variables.MVN):
                     self.pert_mag.value = value[i:]
                     self.pert_mag.set_values(arr=value[i:], use_indicators=True)
                     self.pert_mag.update_str()
-                    self.G.data.design_matrices[STRNAMES.GROWTH_VALUE].update_value()
+                    self.G.data.design_matrices[STRNAMES.GROWTH_VALUE].perturbations_dirty = True
                     # self.G.data.design_matrices[STRNAMES.PERT_VALUE].build()
 
+    def _update_perts_and_inter_separately(self, X: scipy.sparse.spmatrix, y: np.ndarray,
+        rhs: List[str]):
+        '''Update the perturbations and then the interactions separately, reusing the
+        design matrix `X` and observations `y` built for the joint update.
+
+        Parameters
+        ----------
+        X : scipy.sparse
+            Joint design matrix with the interaction columns first
+        y : np.ndarray
+            Observations conditional on everything in `rhs`
+        rhs : list(str)
+            Variables that are in the columns of `X`, in order
+        '''
+        X = scipy.sparse.csc_matrix(X)
+        l = 0
+        if STRNAMES.CLUSTER_INTERACTION_VALUE in rhs:
+            l = self.interactions.obj.num_pos_indicators()
+        X_inter = X[:, :l]
+        X_pert = X[:, l:]
+
+        if STRNAMES.PERT_VALUE in rhs:
+            y_pert = y
+            if l > 0:
+                y_pert = y - (X_inter @ self.interactions.obj.get_values(
+                    use_indicators=True)).reshape(-1,1)
+            self.pert_mag.update(X=X_pert, y=y_pert)
+        if l > 0:
+            y_inter = y
+            if STRNAMES.PERT_VALUE in rhs:
+                y_inter = y - (X_pert @ self.pert_mag.asarray()).reshape(-1,1)
+            self.interactions.update(X=X_inter, y=y_inter)
+
     def add_trace(self):
         '''Trace values for growth, self-interactions, and cluster interaction values
         '''
@@ -7001,10 +7938,8 @@ class PerturbationMagnitudes(pl.variables.Normal):
     def __len__(self) -> int:
         '''Return the number of on indicators
         '''
-        n = 0
-        for perturbation in self.perturbations:
-            n += perturbation.indicator.num_on_clusters()
-        return n
+        return sum(perturbation.indicator.num_on_clusters() for perturbation in \
+            self.perturbations)
 
     def set_values(self, arr: np.ndarray, use_indicators: bool=True):
         '''Set the values of the perturbation of them stacked one on top of each other
@@ -7092,8 +8027,16 @@ class PerturbationMagnitudes(pl.variables.Normal):
                 '\t\tvalue: {}\n'.format(a, perturbation.magnitude.cluster_array())
         logger.info(s)
 
-    def update(self):
+    def update(self, X: np.ndarray=None, y: np.ndarray=None):
         '''Update with a gibbs step jointly
+
+        Parameters
+        ----------
+        X : np.ndarray, None
+            Design matrix of the perturbations. If None, it is built from the data
+        y : np.ndarray, None
+            Observations conditional on everything except the perturbations. If None,
+            it is built from the data
         '''
         if self.sample_iter < self.delay:
             return
@@ -7101,7 +8044,7 @@ class PerturbationMagnitudes(pl.variables.Normal):
         n_on = [perturbation.indicator.num_on_clusters() for perturbation in \
             self.perturbations]
 
-        if n_on == 0:
+        if sum(n_on) == 0:
             return
 
         rhs = [STRNAMES.PERT_VALUE]
@@ -7109,20 +8052,25 @@ class PerturbationMagnitudes(pl.variables.Normal):
             STRNAMES.GROWTH_VALUE,
             STRNAMES.SELF_INTERACTION_VALUE,
             STRNAMES.CLUSTER_INTERACTION_VALUE]
-        X = self.G.data.construct_rhs(keys=rhs, toarray=True)
-        y = self.G.data.construct_lhs(keys=lhs,
-            kwargs_dict={STRNAMES.GROWTH_VALUE:{
-                'with_perturbations':False}})
+        if X is None:
+            X = self.G.data.construct_rhs(keys=rhs, toarray=True)
+        elif scipy.sparse.issparse(X):
+            X = X.toarray()
+        if y is None:
+            y = self.G.data.construct_lhs(keys=lhs,
+                kwargs_dict={STRNAMES.GROWTH_VALUE:{
+                    'with_perturbations':False}})
 
         process_prec = self.G[STRNAMES.PROCESSVAR].prec
-        prior_prec = build_prior_covariance(G=self.G, cov=False, order=rhs, sparse=False)
+        prior_prec = build_prior_covariance(G=self.G, cov=False, order=rhs, diag=True)
 
-        prior_mean = build_prior_mean(G=self.G, order=rhs).reshape(-1,1)
+        prior_mean = build_prior_mean(G=self.G, order=rhs)
 
         a = X.T * process_prec
-        prec = a @ X + prior_prec
-        cov = pinv(prec, self)
-        mean = np.asarray(cov @ (a @ y + prior_prec @ prior_mean)).ravel()
+        prec = a @ X
+        prec[np.diag_indices_from(prec)] += prior_prec
+        mean, var = _posterior_mean_and_variance(prec=prec,
+            rhs=np.ravel(a @ y) + prior_prec * prior_mean, var=self)
 
         # print('\n\ny\n',np.hstack((y, self.G.data.lhs.vector.reshape(-1,1))))
         # print(self.G[STRNAMES.CLUSTER_INTERACTION_VALUE].value)
@@ -7130,10 +8078,10 @@ class PerturbationMagnitudes(pl.variables.Normal):
         # print(self.G[STRNAMES.SELF_INTERACTION_VALUE].value)
 
         self.loc.value = mean
-        self.scale2.value = np.diag(cov)
+        self.scale2.value = var
         value = self.sample()
 
-        if np.any(np.isnan(value)):
+        if np.isnan(np.sum(value)):
             logger.critical('mean: {}'.format(self.loc.value))
             logger.critical('var: {}'.format(self.scale2.value))
             logger.critical('value: {}'.format(self.value))
@@ -7159,10 +8107,10 @@ class PerturbationMagnitudes(pl.variables.Normal):
     def asarray(self) -> np.ndarray:
         '''Get an array of the perturbation magnitudes
         '''
-        a = []
-        for perturbation in self.perturbations:
-            a.append(perturbation.cluster_array(only_pos_ind=True))
-        return np.asarray(list(itertools.chain.from_iterable(a)))
+        if not self.perturbations:
+            return np.zeros(0)
+        return np.concatenate([perturbation.cluster_array(only_pos_ind=True) \
+            for perturbation in self.perturbations]).astype(float, copy=False)
 
     def toarray(self) -> np.ndarray:
         '''Alias for asarray
@@ -7193,6 +8141,8 @@ class PerturbationMagnitudes(pl.variables.Normal):
             have identical values, so we can choose any taxon within the cluster to
             represent it
         '''
+        from . import visualization
+        import matplotlib.pyplot as plt
         perturbation = self.perturbations[pidx]
         taxa = self.G.data.taxa
         clustering = self.G[STRNAMES.CLUSTERING_OBJ]
@@ -7229,6 +8179,9 @@ class PerturbationMagnitudes(pl.variables.Normal):
         else:
             prior_std_trace = np.ones(len_posterior) + np.sqrt(perturbation.magnitude.prior.scale2.value)
 
+        # The prior does not depend on the taxon so we only sample it once
+        prior_samples = pl.random.normal.sample(loc=prior_mean_trace, scale=prior_std_trace)
+
         if fixed_clustering:
             rang = len(clustering)
         else:
@@ -7247,10 +8200,7 @@ class PerturbationMagnitudes(pl.variables.Normal):
                 include_burnin=True, rasterized=True)
 
             low_x, high_x = ax_posterior.get_xlim()
-            arr = np.zeros(len(prior_std_trace), dtype=float)
-            for i in range(len(prior_std_trace)):
-                arr[i] = pl.random.normal.sample(loc=prior_mean_trace[i], scale=prior_std_trace[i])
-            visualization.render_trace(var=arr, plt_type='hist',
+            visualization.render_trace(var=prior_samples, plt_type='hist',
                 label='prior', color='red', ax=ax_posterior, rasterized=True)
 
             ax_posterior.legend()
@@ -7467,6 +8417,14 @@ class PerturbationIndicators(pl.Node):
     '''
     def __init__(self, need_to_trace: bool, relative: bool, **kwargs):
         '''Parameters
+        ----------
+        need_to_trace : bool
+            Whether to trace the indicators
+        relative : bool
+            Whether you update using the relative marginal likelihood or not. If
+            not, `update_slow` recomputes the full marginal likelihood and rebuilds
+            the perturbation design matrix for each indicator. This is the reference
+            implementation and is only meant for checking `update_relative`.
         '''
         kwargs['name'] = STRNAMES.PERT_INDICATOR
         pl.Node.__init__(self, **kwargs)
@@ -7571,6 +8529,9 @@ class PerturbationIndicators(pl.Node):
         for ridx in range(self.G.data.n_replicates):
             self.ndts_bias.append(
                 np.arange(0, self.G.data.n_dts_for_replicate[ridx] * self.n_taxa, self.n_taxa))
+        # Row offset of each (replicate, timepoint) pair in the order of the data
+        self.dt_row_offsets = np.concatenate([self.ndts_bias[ridx] + self.replicate_bias[ridx] \
+            for ridx in range(self.n_replicates)])
 
         s = 'Perturbation indicator initialization results:\n'
         for i, perturbation in enumerate(self.perturbations):
@@ -7582,15 +8543,12 @@ class PerturbationIndicators(pl.Node):
         '''Creates a dictionary that maps the cluster id to the
         rows that correspond to each Taxa in the cluster.
 
-        We cannot cast this with numba because it does not support Fortran style
-        raveling :(.
-
         Returns
         -------
         dict: int -> np.ndarray
             Maps the cluster ID to the row indices corresponding to it
         '''
-        clusters = [np.asarray(oidxs, dtype=int).reshape(-1,1) \
+        clusters = [np.asarray(oidxs, dtype=int) \
             for oidxs in self.clustering.tolistoflists()]
         n_dts=self.G.data.n_dts_for_replicate
 
@@ -7598,21 +8556,8 @@ class PerturbationIndicators(pl.Node):
         cids = self.clustering.order
 
         for cidx,cid in enumerate(cids):
-            a = np.zeros(len(clusters[cidx]) * self.total_dts, dtype=int)
-            i = 0
-            for ridx in range(self.n_replicates):
-                idxs = np.zeros(
-                    (len(clusters[cidx]),
-                    self.n_dts_for_replicate[ridx]), int)
-                idxs = idxs + clusters[cidx]
-                idxs = idxs + self.ndts_bias[ridx]
-                idxs = idxs + self.replicate_bias[ridx]
-                idxs = idxs.ravel('F')
-                l = len(idxs)
-                a[i:i+l] = idxs
-                i += l
-
-            d[cid] = a
+            # Rows are ordered by replicate, then timepoint, then taxon
+            d[cid] = (self.dt_row_offsets.reshape(-1,1) + clusters[cidx]).ravel()
 
         if self.G.data.zero_inflation_transition_policy is not None:
             # We need to convert the indices that are meant from no zero inflation to
@@ -7621,16 +8566,11 @@ class PerturbationIndicators(pl.Node):
             # included, then we subtract the number of indexes that are previously off
             # before that index. If it should not be included then we exclude it
             prevoff_arr = self.G.data.off_previously_arr_zero_inflation
-            rows_to_include = self.G.data.zero_inflation_transition_policy
+            rows_to_include = self.G.data.rows_to_include_zero_inflation
             for cid in d:
                 arr = d[cid]
-                new_arr = np.zeros(len(arr), dtype=int)
-                n = 0
-                for i, idx in enumerate(arr):
-                    if rows_to_include[idx]:
-                        new_arr[n] = idx - prevoff_arr[i]
-                        n += 1
-                new_arr = new_arr[:n]
+                arr = arr[rows_to_include[arr]]
+                d[cid] = arr - prevoff_arr[arr]
         return d
 
     # @profile
@@ -7675,15 +8615,21 @@ class PerturbationIndicators(pl.Node):
               is positive. This is different for each perturbation.
         - perturbationsXs : dict (int -> np.ndarray)
             - Maps the target cluster id to the design matrix that corresponds to
-              the on perturbations of the target clusters. This is preindexed by the
-              rows but not the columns - the columns assume that all of the perturbations
-              are on and we index the ones that we want.
+              the perturbations of the target cluster, assuming that all of them are
+              on. This is preindexed by the rows and by the columns of the target
+              cluster - column `p` is the perturbation index `p`. The columns of the
+              other clusters are zero on these rows.
         - prior_prec_perturbations : np.ndarray
             - This is the prior precision of the magnitude for each of the perturbations. Use
               the perturbation index to get the value
         - prior_mean_perturbations : np.ndarray
             - This is the prior mean of the magnitude for each one of the perturbations. Use
               the perturbation index to get the value
+        - XtPXs, XtPys : dict (int -> np.ndarray)
+            - Maps the target cluster id to the products of the design matrix of the
+              cluster (the perturbations of `perturbationsXs`, then the interactions of
+              `interactionXs`) with the process precision. Views into `stacked_XtPXs`
+              and `stacked_XtPys`
         '''
         row_idxs = self._make_idx_for_clusters()
 
@@ -7704,64 +8650,94 @@ class PerturbationIndicators(pl.Node):
         # Make interactionXs
         self.interactionXs = {}
         interactions = self.G[STRNAMES.INTERACTIONS_OBJ]
-        XM_master = self.G.data.design_matrices[STRNAMES.CLUSTER_INTERACTION_VALUE].toarray()
+        XM_master = self.G.data.design_matrices[STRNAMES.CLUSTER_INTERACTION_VALUE].matrix.tocsr()
+        # Target cluster of each column of `XM_master` (positive indicators)
+        target_cids = np.fromiter((tcid for tcid, _ in interactions.iter_valid_pairs()),
+            dtype=int)
         for tcid in self.clustering.order:
-            cols = []
-            for i, interaction in enumerate(interactions.iter_valid()):
-                if interaction.target_cid == tcid:
-                    if interaction.indicator:
-                        cols.append(i)
-            cols = np.asarray(cols, dtype=int)
-            self.interactionXs[tcid] = pl.util.fast_index(M=XM_master,
-                rows=row_idxs[tcid], cols=cols)
+            cols = np.flatnonzero(target_cids == tcid)
+            self.interactionXs[tcid] = _dense_block(XM_master, rows=row_idxs[tcid], cols=cols)
 
         # Make prior parameters for interactions
         self.prior_prec_interaction = 1/self.G[STRNAMES.PRIOR_VAR_INTERACTIONS].value
         self.prior_mean_interaction = self.G[STRNAMES.PRIOR_MEAN_INTERACTIONS].value
 
         # Make the perturbation parameters
-        self.prior_ll_ons = []
-        self.prior_ll_offs = []
-        self.priorvar_logdet_diffs = []
-        self.prior_prec_perturbations = []
-        self.prior_mean_perturbations = []
-
-        for perturbation in self.G.perturbations:
-            prob_on = perturbation.probability.value
-            self.prior_ll_ons.append(np.log(prob_on))
-            self.prior_ll_offs.append(np.log(1 - prob_on))
-
-            self.priorvar_logdet_diffs.append(
-                np.log(perturbation.magnitude.prior.scale2.value))
-
-            self.prior_prec_perturbations.append(
-                1/perturbation.magnitude.prior.scale2.value)
-
-            self.prior_mean_perturbations.append(
-                perturbation.magnitude.prior.loc.value)
-
-        # Make perturbation matrices
+        probs_on = np.asarray([perturbation.probability.value
+            for perturbation in self.G.perturbations], dtype=float)
+        prior_vars = np.asarray([perturbation.magnitude.prior.scale2.value
+            for perturbation in self.G.perturbations], dtype=float)
+        self.prior_ll_ons = np.log(probs_on)
+        self.prior_ll_offs = np.log1p(-probs_on)
+        self.priorvar_logdet_diffs = np.log(prior_vars)
+        self.prior_prec_perturbations = 1/prior_vars
+        self.prior_mean_perturbations = np.asarray([perturbation.magnitude.prior.loc.value
+            for perturbation in self.G.perturbations], dtype=float)
+
+        # Make perturbation matrices. Column `cidx + n_clusters * pidx` of the
+        # master matrix is the perturbation `pidx` of cluster `cidx`
+        n_perts = len(self.perturbations)
+        n_clusters = len(self.clustering.order)
         self.perturbationsXs = {}
         self.G.data.design_matrices[STRNAMES.PERT_VALUE].M.build(build=True,
             build_for_neg_ind=True)
-        Xpert_master = self.G.data.design_matrices[STRNAMES.PERT_VALUE].toarray()
+        Xpert_master = self.G.data.design_matrices[STRNAMES.PERT_VALUE].matrix.tocsr()
+        for cidx, tcid in enumerate(self.clustering.order):
+            self.perturbationsXs[tcid] = _dense_block(Xpert_master, rows=row_idxs[tcid],
+                cols=cidx + n_clusters * np.arange(n_perts))
+
+        # Only the perturbation columns that are used change between the indicators
+        # so precompute the products for all of the columns of the cluster
+        # (perturbations first, then interactions), padded and stacked for
+        # `_perturbation_indicator_sweep`, and index them when calculating the
+        # likelihoods
+        self.n_inters = np.asarray([self.interactionXs[tcid].shape[1]
+            for tcid in self.clustering.order], dtype=int)
+        k = n_perts + np.max(self.n_inters, initial=0)
+        self.stacked_XtPXs = np.zeros((n_clusters, k, k))
+        self.stacked_XtPys = np.zeros((n_clusters, k))
+        self.XtPXs = {}
+        self.XtPys = {}
+        self._marginal_terms = np.zeros(4)
+        for cidx, tcid in enumerate(self.clustering.order):
+            X = np.hstack((self.perturbationsXs[tcid], self.interactionXs[tcid]))
+            a = X.T * self.process_precs[tcid]
+            m = X.shape[1]
+            self.XtPXs[tcid] = self.stacked_XtPXs[cidx, :m, :m]
+            self.XtPys[tcid] = self.stacked_XtPys[cidx, :m]
+            self.XtPXs[tcid][:] = a @ X
+            self.XtPys[tcid][:] = np.ravel(a @ self.ys[tcid])
+
+        # Scratch buffers for the columns (into `XtPXs`) and prior parameters of the
+        # system. The interactions (fixed for each target cluster) go first, then
+        # the perturbations
+        self.cols_scratch = {}
+        self.prior_mean_scratch = {}
+        self.prior_prec_scratch = {}
         for tcid in self.clustering.order:
-            self.perturbationsXs[tcid] = Xpert_master[row_idxs[tcid], :]
+            n_inter = self.interactionXs[tcid].shape[1]
+            cols = np.empty(n_inter + n_perts, dtype=int)
+            cols[:n_inter] = n_perts + np.arange(n_inter)
+            self.cols_scratch[tcid] = cols
+            self.prior_mean_scratch[tcid] = np.full(n_inter + n_perts,
+                self.prior_mean_interaction, dtype=float)
+            self.prior_prec_scratch[tcid] = np.full(n_inter + n_perts,
+                self.prior_prec_interaction, dtype=float)
 
         self.n_clusters = len(self.clustering.order)
         self.clustering_order = self.clustering.order
 
-        self.col2pidxcidx = []
-        for pidx in range(len(self.perturbations)):
-            for cidx in range(len(self.clustering.order)):
-                self.col2pidxcidx.append((pidx, cidx))
+        # Column `idx` is the perturbation `idx // n_clusters` of the cluster
+        # `idx % n_clusters`
+        self.col2pidx, self.col2cidx = np.divmod(
+            np.arange(len(self.perturbations) * self.n_clusters), self.n_clusters)
 
-        self.arr = []
-        for perturbation in self.perturbations:
-            self.arr = np.append(
-                self.arr,
-                perturbation.indicator.cluster_bool_array())
-        self.arr = np.asarray(self.arr, dtype=bool)
+        self.arr = np.empty(len(self.perturbations) * self.n_clusters, dtype=bool)
+        for pidx, perturbation in enumerate(self.perturbations):
+            self.arr[pidx*self.n_clusters:(pidx+1)*self.n_clusters] = \
+                perturbation.indicator.cluster_bool_array()
+        # View of `arr` indexed by (pidx, cidx)
+        self.arr2d = self.arr.reshape(len(self.perturbations), self.n_clusters)
 
     # @profile
     def update_relative(self):
@@ -7777,7 +8753,9 @@ class PerturbationIndicators(pl.Node):
         Because these matrices are considerably smaller and considered 'dense', we
         do the operations in numpy instead of scipy sparse.
 
-        We permute the order that the indices are updated for more robust mixing
+        We permute the order that the indices are updated for more robust mixing.
+        Given the rest of the indicators the indicators of each cluster are
+        independent of the other clusters, so the clusters are updated in parallel.
         '''
         if self.sample_iter < self.delay:
             return
@@ -7786,16 +8764,22 @@ class PerturbationIndicators(pl.Node):
         self.make_rel_params()
 
         # Iterate over each perturbation indicator variable
-        iidxs = npr.permutation(len(self.arr))
-        for iidx in iidxs:
-            self.update_single_idx_fast(idx=iidx)
-
-        # Set the perturbation indicators from arr
-        i = 0
-        for perturbation in self.perturbations:
-            for cid in self.clustering.order:
-                perturbation.indicator.value[cid] = self.arr[i]
-                i += 1
+        n_perts = len(self.perturbations)
+        order = np.argsort(npr.random(size=(self.n_clusters, n_perts)), axis=1)
+        us = npr.random(size=(self.n_clusters, n_perts))
+        n_done = _perturbation_indicator_sweep(self.arr, order, us,
+            self.stacked_XtPXs, self.stacked_XtPys, self.n_inters,
+            self.prior_mean_perturbations, self.prior_prec_perturbations,
+            self.priorvar_logdet_diffs, self.prior_ll_ons, self.prior_ll_offs,
+            float(self.prior_mean_interaction), float(self.prior_prec_interaction))
+        for cidx in range(self.n_clusters):
+            for j in range(n_done[cidx], n_perts):
+                self.update_single_idx_fast(idx=cidx + order[cidx, j] * self.n_clusters)
+
+        # Set the perturbation indicators from arr, one perturbation at a time
+        for pidx, perturbation in enumerate(self.perturbations):
+            perturbation.indicator.value.update(
+                zip(self.clustering.order, self.arr2d[pidx].tolist()))
 
         # rebuild the growth design matrix
         self.G.data.design_matrices[STRNAMES.PERT_VALUE].M.build()
@@ -7806,17 +8790,15 @@ class PerturbationIndicators(pl.Node):
     def update_single_idx_fast(self, idx: int):
         '''Do a Gibbs step for a single cluster
         '''
-        pidx, cidx = self.col2pidxcidx[idx]
+        pidx = self.col2pidx[idx]
 
         prior_ll_on = self.prior_ll_ons[pidx]
         prior_ll_off = self.prior_ll_offs[pidx]
 
-        d_on = self.calculate_relative_marginal_loglikelihood(idx=idx, val=True)
-        d_off = self.calculate_relative_marginal_loglikelihood(idx=idx, val=False)
+        d_on, d_off = self.calculate_relative_marginal_loglikelihoods(idx=idx)
 
         ll_on = d_on + prior_ll_on
         ll_off = d_off + prior_ll_off
-        dd = [ll_off, ll_on]
 
         # print('\nindicator', idx)
         # print('fast\n\ttotal: {}\n\tbeta_logdet_diff: {}\n\t' \
@@ -7829,97 +8811,79 @@ class PerturbationIndicators(pl.Node):
         #         d_on['bEbprior'] - d_off['bEbprior']))
         # self.update_single_idx_slow(idx)
 
-        res = bool(sample_categorical_log(dd))
-        self.arr[idx] = res
+        self.arr[idx] = sample_bernoulli_logit(ll_on - ll_off)
 
     # @profile
-    def calculate_relative_marginal_loglikelihood(self, idx: int, val: bool) -> float:
+    def calculate_relative_marginal_loglikelihoods(self, idx: int) -> Tuple[float, float]:
         '''Calculate the relative marginal loglikelihood of switching the `idx`'th index
-        of the perturbation matrix to `val`
+        of the perturbation matrix on and off
+
+        The perturbation being sampled is put in the last column so that both are
+        calculated from a single Cholesky factorization.
 
         Parameters
         ----------
         idx : int
             This is the index of the indicator we are sampling
-        val : bool
-            This is the value we are testing it at.
 
         Returns
         -------
-        float
+        float, float
+            Relative marginal log likelihood with the indicator on, then off
         '''
         # Create and get the data
-        self.arr[idx] = val
-        pidx, cidx = self.col2pidxcidx[idx]
+        pidx = self.col2pidx[idx]
+        cidx = self.col2cidx[idx]
         tcid = self.clustering_order[cidx]
 
-        y = self.ys[tcid]
-        process_prec = self.process_precs[tcid]
-        X = self.interactionXs[tcid]
-
-        prior_mean = []
-        prior_prec_diag = []
-        cols = []
-        for temp_pidx in range(len(self.perturbations)):
-            col = int(cidx + temp_pidx * self.n_clusters)
-            if self.arr[col]:
-                cols.append(col)
-                prior_mean.append(self.prior_mean_perturbations[temp_pidx])
-                prior_prec_diag.append(self.prior_prec_perturbations[temp_pidx])
-        Xpert = self.perturbationsXs[tcid][:, cols]
-
-        if Xpert.shape[1] + X.shape[1] == 0:
-            # return {
-            #     'ret': 0,
-            #     'beta_logdet': 0,
-            #     'priorvar_logdet': 0,
-            #     'bEb': 0,
-            #     'bEbprior': 0}
-            return 0
-
-        prior_mean = np.append(
-            prior_mean,
-            np.full(X.shape[1], self.prior_mean_interaction))
-        prior_prec_diag = np.append(
-            prior_prec_diag,
-            np.full(X.shape[1], self.prior_prec_interaction))
-        X = np.hstack((Xpert, X))
-        prior_prec = np.diag(prior_prec_diag)
-        pm = (prior_prec_diag * prior_mean).reshape(-1,1)
+        n_inter = self.interactionXs[tcid].shape[1]
+        cols = self.cols_scratch[tcid]
+        prior_mean = self.prior_mean_scratch[tcid]
+        prior_prec_diag = self.prior_prec_scratch[tcid]
+
+        # Add the positive perturbations after the interactions and then the one
+        # that we are sampling
+        mask = self.arr2d[:, cidx].copy()
+        mask[pidx] = False
+        on_pidxs = np.flatnonzero(mask)
+        n = n_inter + len(on_pidxs)
+        cols[n_inter:n] = on_pidxs
+        prior_mean[n_inter:n] = self.prior_mean_perturbations[on_pidxs]
+        prior_prec_diag[n_inter:n] = self.prior_prec_perturbations[on_pidxs]
+        n_cols_off = n
+        cols[n] = pidx
+        prior_mean[n] = self.prior_mean_perturbations[pidx]
+        prior_prec_diag[n] = self.prior_prec_perturbations[pidx]
+        cols = cols[:n+1]
+        prior_mean = prior_mean[:n+1]
+        prior_prec_diag = prior_prec_diag[:n+1]
 
         # Do the marginalization
-        a = X.T * process_prec
-        beta_prec = (a @ X) + prior_prec
-        beta_cov = pinv(beta_prec, self)
-        beta_mean = beta_cov @ ((a @ y) + pm )
-
-        bEb = (beta_mean.T @ beta_prec @ beta_mean)[0,0]
-        try:
-            beta_logdet = log_det(beta_cov, self)
-        except:
-            logger.critical('Crashed in log_det')
-            logger.critical('beta_cov:\n{}'.format(beta_cov))
-            logger.critical('prior_prec\n{}'.format(prior_prec))
-            raise
-
-        if val:
-            bEbprior = (self.prior_mean_perturbations[pidx]**2) * \
-                self.prior_prec_perturbations[pidx]
-            priorvar_logdet = self.priorvar_logdet_diffs[pidx]
+        XtPX = self.XtPXs[tcid]
+        XtPy = self.XtPys[tcid]
+        terms = self._marginal_terms
+        if _gram_marginal_on_off(XtPX, XtPy, cols, prior_prec_diag, prior_mean, terms):
+            beta_logdet_on, bEb_on, beta_logdet_off, bEb_off = terms
         else:
-            bEbprior = 0
-            priorvar_logdet = 0
-
-        ll2 = 0.5 * (beta_logdet - priorvar_logdet)
-        ll3 = 0.5 * (bEb - bEbprior)
-
-        # return {
-        #     'ret': ll2+ll3,
-        #     'beta_logdet': beta_logdet,
-        #     'priorvar_logdet': priorvar_logdet,
-        #     'bEb': bEb,
-        #     'bEbprior': bEbprior}
-        return ll2 + ll3
+            beta_prec = XtPX[np.ix_(cols, cols)]
+            beta_prec[np.diag_indices_from(beta_prec)] += prior_prec_diag
+            try:
+                (beta_logdet_on, bEb_on), (beta_logdet_off, bEb_off) = \
+                    _marginal_logdet_and_quadratic_on_off(prec=beta_prec,
+                        rhs=XtPy[cols] + prior_prec_diag * prior_mean, var=self)
+            except:
+                logger.critical('Crashed in log_det')
+                logger.critical('prior_prec_diag\n{}'.format(prior_prec_diag))
+                raise
+
+        bEbprior = (self.prior_mean_perturbations[pidx]**2) * \
+            self.prior_prec_perturbations[pidx]
+        priorvar_logdet = self.priorvar_logdet_diffs[pidx]
+        ll_on = 0.5 * (beta_logdet_on - priorvar_logdet) + 0.5 * (bEb_on - bEbprior)
+        if n_cols_off == 0:
+            return ll_on, 0
+        ll_off = 0.5 * beta_logdet_off + 0.5 * bEb_off
+        return ll_on, ll_off
 
     # @profile
     def update_slow(self):
@@ -8005,23 +8969,20 @@ class PerturbationIndicators(pl.Node):
 
         # Calculate the posterior
         beta_prec = X.T @ process_prec @ X + prior_prec
-        beta_cov = pinv(beta_prec, self)
-        beta_mean = beta_cov @ ( X.T @ process_prec @ y + prior_prec @ prior_mean )
-        beta_mean = np.asarray(beta_mean).reshape(-1,1)
 
         # Perform the marginalization
         try:
-            beta_logdet = log_det(beta_cov, self)
+            beta_logdet, bEb = _marginal_logdet_and_quadratic(prec=beta_prec,
+                rhs=X.T @ process_prec @ y + prior_prec @ prior_mean, var=self)
         except:
             logger.critical('Crashed in log_det')
-            logger.critical('beta_cov:\n{}'.format(beta_cov))
             logger.critical('prior_prec\n{}'.format(prior_prec))
             raise
         priorvar_logdet = log_det(prior_var, self)
         ll2 = 0.5 * (beta_logdet - priorvar_logdet)
 
         a = np.asarray(prior_mean.T @ prior_prec @ prior_mean)[0,0]
-        b = np.asarray(beta_mean.T @ beta_prec @ beta_mean)[0,0]
+        b = bEb
         ll3 = -0.5 * (a  - b)
 
         return {
@@ -8140,16 +9101,11 @@ class PriorVarPerturbations(pl.Variable):
         -------
         np.ndarray
         '''
-        ret = []
-        for perturbation in self.perturbations:
-            if only_pos_ind:
-                n = perturbation.indicator.num_on_clusters()
-            else:
-                n = len(perturbation.clustering)
-            ret = np.append(
-                ret,
-                np.ones(n, dtype=float)*perturbation.magnitude.prior.scale2.value)
-        return ret
+        if only_pos_ind:
+            ns = [perturbation.indicator.num_on_clusters() for perturbation in self.perturbations]
+        else:
+            ns = [len(perturbation.clustering) for perturbation in self.perturbations]
+        return np.repeat(self.get_single_value_of_perts().astype(float), ns)
 
     def visualize(self, path: str, f: IO, pidx: int, section: str='posterior') -> IO:
         '''Visualize the `pidx`th perturbation prior magnitude
@@ -8296,7 +9252,8 @@ class PriorVarPerturbationSingle(pl.variables.SICS):
         x = self.perturbation.cluster_array(only_pos_ind=True)
         mu = self.perturbation.magnitude.prior.loc.value
 
-        se = np.sum(np.square(x - mu))
+        d = np.asarray(x, dtype=float) - mu
+        se = d @ d
         n = len(x)
 
         self.dof.value = self.prior.dof.value + n
@@ -8367,15 +9324,11 @@ class PriorMeanPerturbations(pl.Variable):
         -------
         np.ndarray
         '''
-        ret = []
-        for perturbation in self.perturbations:
-            if only_pos_ind:
-                n = perturbation.indicator.num_on_clusters()
-            else:
-                n = len(perturbation.clustering)
-            ret = np.append(
-                ret, np.zeros(n, dtype=float)+perturbation.magnitude.prior.loc.value)
-        return ret
+        if only_pos_ind:
+            ns = [perturbation.indicator.num_on_clusters() for perturbation in self.perturbations]
+        else:
+            ns = [len(perturbation.clustering) for perturbation in self.perturbations]
+        return np.repeat(self.get_single_value_of_perts().astype(float), ns)
 
     def visualize(self, path: str, f: IO, pidx: int, section: str='posterior') -> IO:
         '''Visualize the `pidx`th perturbation prior magnitude
@@ -8501,14 +9454,18 @@ class PriorMeanPerturbationSingle(pl.variables.Normal):
         if self.sample_iter < self.delay:
             return
 
+        # Work with Python floats so the arithmetic does not box numpy scalars
         x = self.perturbation.cluster_array(only_pos_ind=True)
-        prec = 1/self.perturbation.magnitude.prior.scale2.value
+        n = len(x)
+        sum_x = float(np.sum(x))
+        prec = 1/float(self.perturbation.magnitude.prior.scale2.value)
 
-        prior_prec = 1/self.prior.scale2.value
-        prior_mean = self.prior.loc.value
+        prior_prec = 1/float(self.prior.scale2.value)
+        prior_mean = float(self.prior.loc.value)
 
-        self.scale2.value = 1/(prior_prec + (len(x)*prec))
-        self.loc.value = self.scale2.value * ((prior_mean * prior_prec) + (np.sum(x)*prec))
+        var = 1/(prior_prec + (n*prec))
+        self.scale2.value = var
+        self.loc.value = var * ((prior_mean * prior_prec) + (sum_x*prec))
         self.sample()
 
 
@@ -8569,6 +9526,11 @@ class _qPCRPriorAggVar(_qPCRBase):
             self.value.append(
                 child(L=L, l=l, **kwargs))
 
+    def toarray(self) -> np.ndarray:
+        '''Return the value of each qPCR set as an array
+        '''
+        return np.fromiter((a.value for a in self.value), dtype=float, count=self.L)
+
     def add_qpcr_measurement(self, ridx, tidx, sidx):
         '''Add a qPCR measurement for subject `ridx` at time index
         `tidx` to qPCR set `l`
@@ -8622,6 +9584,24 @@ class qPCRVariances(_qPCRBase):
             self.value.append(
                 qPCRVarianceReplicate(ridx=ridx, **kwargs))
 
+    def update(self):
+        '''Update the qPCR variances of every replicate in a single draw. The
+        variances of each replicate are drawn in the same order as if each
+        replicate was updated on its own
+        '''
+        prior_dofs = self.G[STRNAMES.QPCR_DOFS].toarray()
+        prior_scales = self.G[STRNAMES.QPCR_SCALES].toarray()
+        params = [a.posterior_params(prior_dofs=prior_dofs, prior_scales=prior_scales) \
+            for a in self.value]
+        values = pl.random.sics.sample(
+            np.concatenate([dof for dof, _ in params]),
+            np.concatenate([scale for _, scale in params]))
+        i = 0
+        for a in self.value:
+            a.value[:] = values[i:i+len(a.value)]
+            i += len(a.value)
+        self._sample_iter += 1
+
     def add_qpcr_measurement(self, ridx, tidx, sidx):
         '''Add a qPCR measurement for subject `ridx` at time index
         `tidx` to qPCR set `l`
@@ -8727,34 +9707,51 @@ class qPCRVarianceReplicate(pl.variables.SICS):
         for tidx, t in enumerate(self.G.data.given_timepoints[self.ridx]):
             self.qpcr_measurements.append(self.G.data.qpcr[self.ridx][t].log_data)
 
-    def update(self):
+        # Flatten the measurements so that every time index is updated at once.
+        # `qpcr_tidxs` is the time index of each value in `qpcr_values` and
+        # `qpcr_cols` is its column in the latent abundance
+        self.qpcr_values = np.concatenate(
+            [np.ravel(values) for values in self.qpcr_measurements]).astype(float)
+        self.qpcr_lens = np.asarray([np.size(values) for values in self.qpcr_measurements])
+        self.qpcr_tidxs = np.repeat(np.arange(len(self.qpcr_lens)), self.qpcr_lens)
+        self.tidxs_in_arr = np.asarray([self.G.data.timepoint2index[self.ridx][t] \
+            for t in self.G.data.given_timepoints[self.ridx]], dtype=int)
+        self.qpcr_cols = self.tidxs_in_arr[self.qpcr_tidxs]
 
-        prior_dofs = []
-        prior_scales = []
-        for l in range(self.L):
-            prior_dofs.append(self.G[STRNAMES.QPCR_DOFS].value[l].value)
-            prior_scales.append(self.G[STRNAMES.QPCR_SCALES].value[l].value)
+    def update(self):
+        dof, scale = self.posterior_params(
+            prior_dofs=self.G[STRNAMES.QPCR_DOFS].toarray(),
+            prior_scales=self.G[STRNAMES.QPCR_SCALES].toarray())
+        self.value[:] = pl.random.sics.sample(dof, scale)
 
-        for tidx in range(len(self.priors_idx)):
-            t = self.G.data.given_timepoints[self.ridx][tidx]
-            l = self.priors_idx[tidx]
-            prior_dof = prior_dofs[l]
-            prior_scale = prior_scales[l]
+    def posterior_params(self, prior_dofs: np.ndarray,
+        prior_scales: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        '''Calculate the posterior degrees of freedom and scale of each qPCR variance
 
-            # qPCR measurements (these are already in log space)
-            values = self.qpcr_measurements[tidx]
+        Parameters
+        ----------
+        prior_dofs, prior_scales : np.ndarray
+            Prior degrees of freedom and scale for each qPCR set
 
-            # Current mean is the log of the sum of latent abundance
-            tidx_in_arr = self.G.data.timepoint2index[self.ridx][t]
-            mean = np.log(np.sum(self.G.data.data[self.ridx][:, tidx_in_arr]))
+        Returns
+        -------
+        np.ndarray, np.ndarray
+            Degrees of freedom and scale for each time index
+        '''
+        prior_dof = prior_dofs[self.priors_idx]
+        prior_scale = prior_scales[self.priors_idx]
 
-            # Calculate the residual sum
-            resid_sum = np.sum(np.square(values - mean))
+        # Current mean is the log of the sum of latent abundance. The qPCR
+        # measurements are already in log space. Sum every column in place instead
+        # of copying out the qPCR columns first
+        log_totals = np.log(np.sum(self.G.data.data[self.ridx], axis=0))
+        resid_sums = _qpcr_resid_sums(self.qpcr_values, self.qpcr_tidxs, self.qpcr_cols,
+            log_totals, len(self.qpcr_lens))
 
-            # posterior
-            dof = prior_dof + len(values)
-            scale = ((prior_scale * prior_dof) + resid_sum)/dof
-            self.value[tidx] = pl.random.sics.sample(dof, scale)
+        # posterior
+        dof = prior_dof + self.qpcr_lens
+        scale = ((prior_scale * prior_dof) + resid_sums)/dof
+        return dof, scale
 
     def add_qpcr_measurement(self, tidx, l):
         '''Add qPCR measurement for subject index `ridx` and time index `tidx`
@@ -8878,11 +9875,14 @@ class qPCRDegsOfFreedomL(pl.variables.Uniform):
             raise ValueError('`delay` ({}) must be >= 0'.format(delay))
         self.delay = delay
 
-        self.qpcr_data = []
+        qpcr_data = [np.zeros(0)]
         for ridx, tidx in self.data_locs:
             t = self.G.data.given_timepoints[ridx][tidx]
-            self.qpcr_data = np.append(self.qpcr_data,
-                self.G.data.qpcr[ridx][t].log_data)
+            qpcr_data.append(np.ravel(self.G.data.qpcr[ridx][t].log_data))
+        self.qpcr_data = np.concatenate(qpcr_data)
+        self.data_loc_groups, self.data_loc_positions = _group_qpcr_data_locs(self.data_locs)
+        self._xs_scratch = np.empty(len(self.data_locs))
+        self._xs = np.empty(len(self.data_locs))
 
         # Set the prior low
         if not pl.isstr(low_option):
@@ -8976,6 +9976,7 @@ class qPCRDegsOfFreedomL(pl.variables.Uniform):
         else:
             raise TypeError('`end_tune` ({}) type not recognized'.format(type(end_tune)))
         self.end_tune = end_tune
+        self._tuning_done = False
 
         # Set the proposal variance
         if not pl.isstr(proposal_option):
@@ -8993,8 +9994,10 @@ class qPCRDegsOfFreedomL(pl.variables.Uniform):
             raise ValueError('`proposal_option` ({}) not recognized'.format(
                 proposal_option))
         self.proposal.scale2.value = proposal_var
+        self._proposal_std = math.sqrt(proposal_var)
         self.proposal.low = self.prior.low.value
         self.proposal.high = self.prior.high.value
+        self._proposal_bounds = (float(self.proposal.low), float(self.proposal.high))
 
     def update_var(self):
         '''Update the variance of the proposal
@@ -9005,6 +10008,7 @@ class qPCRDegsOfFreedomL(pl.variables.Uniform):
 
         elif self.sample_iter > self.end_tune:
             # Don't do any more updates
+            self._tuning_done = True
             return
 
         elif self.sample_iter % self.tune == 0:
@@ -9014,59 +10018,45 @@ class qPCRDegsOfFreedomL(pl.variables.Uniform):
                 self.proposal.scale2.value *= 1.5
             else:
                 self.proposal.scale2.value /= 1.5
+            self._proposal_std = math.sqrt(self.proposal.scale2.value)
             self.temp_acceptances = 0
 
     def update(self):
         '''First we update the proposal (if necessary) and then we do a MH step
         '''
-        self.update_var()
-        proposal_std = np.sqrt(self.proposal.scale2.value)
+        if not self._tuning_done:
+            self.update_var()
+        proposal_std = self._proposal_std
 
         # Get the data
-        xs = []
-        for ridx, tidx in self.data_locs:
-            xs.append(self.G[STRNAMES.QPCR_VARIANCES].value[ridx].value[tidx])
+        xs = _gather_qpcr_variances(self.G[STRNAMES.QPCR_VARIANCES].value,
+            groups=self.data_loc_groups, positions=self.data_loc_positions,
+            scratch=self._xs_scratch, out=self._xs)
 
         # Get the scale
         scale = self.G[STRNAMES.QPCR_SCALES].value[self.l].value
 
         # Propose a new value for the dof
         prev_dof = self.value
-        self.proposal.loc.value = self.value
-        new_dof = self.proposal.sample()
+        low, high = self._proposal_bounds
+        new_dof = pl.random.misc.fast_sample_truncated_normal(float(prev_dof),
+            proposal_std, low, high)
 
-        if new_dof < self.prior.low.value or new_dof > self.prior.high.value:
+        # The proposal bounds are the bounds of the prior
+        if new_dof < low or new_dof > high:
             # Automatic reject
             self.value = prev_dof
             return
 
-        # Calculate the target distribution log likelihood
-        prev_target_ll = 0
-        for x in xs:
-            prev_target_ll += pl.random.sics.logpdf(value=x,
-                scale=scale, dof=prev_dof)
-        new_target_ll = 0
-        for x in xs:
-            new_target_ll += pl.random.sics.logpdf(value=x,
-                scale=scale, dof=new_dof)
-
-        # Normalize by the loglikelihood of the proposal
-        prev_prop_ll = pl.random.truncnormal.logpdf(
-            value=prev_dof, loc=new_dof, scale=proposal_std,
-            low=self.proposal.low, high=self.proposal.high)
-        new_prop_ll = pl.random.truncnormal.logpdf(
-            value=new_dof, loc=prev_dof, scale=proposal_std,
-            low=self.proposal.low, high=self.proposal.high)
-
-        # Accept or reject
-        r = (new_target_ll - prev_target_ll) + (prev_prop_ll - new_prop_ll)
-        u = np.log(pl.random.misc.fast_sample_standard_uniform())
-        if r >= u:
+        # Accept or reject on the target distribution log likelihood,
+        # normalized by the loglikelihood of the proposal
+        u = -pl.random.misc.fast_sample_standard_exponential()
+        self.value, accepted = _qpcr_dof_mh_step(xs, scale=float(scale),
+            prev_dof=float(prev_dof), new_dof=float(new_dof),
+            proposal_std=proposal_std, low=low, high=high, log_u=u)
+        if accepted:
             self.acceptances[self.sample_iter] = True
-            self.value = new_dof
             self.temp_acceptances += 1
-        else:
-            self.value = prev_dof
 
 
 class qPCRScales(_qPCRPriorAggVar):
@@ -9155,11 +10145,14 @@ class qPCRScaleL(pl.variables.SICS):
             raise ValueError('`delay` ({}) must be >= 0'.format(delay))
         self.delay = delay
 
-        self.qpcr_data = []
+        qpcr_data = [np.zeros(0)]
         for ridx, tidx in self.data_locs:
             t = self.G.data.given_timepoints[ridx][tidx]
-            self.qpcr_data = np.append(self.qpcr_data,
-                self.G.data.qpcr[ridx][t].log_data)
+            qpcr_data.append(np.ravel(self.G.data.qpcr[ridx][t].log_data))
+        self.qpcr_data = np.concatenate(qpcr_data)
+        self.data_loc_groups, self.data_loc_positions = _group_qpcr_data_locs(self.data_locs)
+        self._xs_scratch = np.empty(len(self.data_locs))
+        self._xs = np.empty(len(self.data_locs))
 
         # Set the prior dof
         if not pl.isstr(dof_option):
@@ -9246,6 +10239,7 @@ class qPCRScaleL(pl.variables.SICS):
         else:
             raise TypeError('`end_tune` ({}) type not recognized'.format(type(end_tune)))
         self.end_tune = end_tune
+        self._tuning_done = False
 
         # Set the proposal variance
         if not pl.isstr(proposal_option):
@@ -9263,8 +10257,11 @@ class qPCRScaleL(pl.variables.SICS):
             raise ValueError('`proposal_option` ({}) not recognized'.format(
                 proposal_option))
         self.proposal.scale2.value = proposal_var
+        self._proposal_std = math.sqrt(proposal_var)
         self.proposal.low = 0
         self.proposal.high = float('inf')
+        self._proposal_bounds = (float(self.proposal.low), float(self.proposal.high))
+        self._prior_params = (float(self.prior.dof.value), float(self.prior.scale.value))
 
     def update_var(self):
         '''Update the variance of the proposal
@@ -9275,6 +10272,7 @@ class qPCRScaleL(pl.variables.SICS):
 
         elif self.sample_iter > self.end_tune:
             # Don't do any more updates
+            self._tuning_done = True
             return
 
         elif self.sample_iter % self.tune == 0:
@@ -9284,54 +10282,38 @@ class qPCRScaleL(pl.variables.SICS):
                 self.proposal.scale2.value *= 1.5
             else:
                 self.proposal.scale2.value /= 1.5
+            self._proposal_std = math.sqrt(self.proposal.scale2.value)
             self.temp_acceptances = 0
 
     def update(self):
         '''First we update the proposal (if necessary) and then we do a MH step
         '''
-        self.update_var()
-        proposal_std = np.sqrt(self.proposal.scale2.value)
+        if not self._tuning_done:
+            self.update_var()
+        proposal_std = self._proposal_std
 
         # Get the data
-        xs = []
-        for ridx, tidx in self.data_locs:
-            xs.append(self.G[STRNAMES.QPCR_VARIANCES].value[ridx].value[tidx])
+        xs = _gather_qpcr_variances(self.G[STRNAMES.QPCR_VARIANCES].value,
+            groups=self.data_loc_groups, positions=self.data_loc_positions,
+            scratch=self._xs_scratch, out=self._xs)
 
         # Get the dof
         dof = self.G[STRNAMES.QPCR_DOFS].value[self.l].value
 
         # Propose a new value for the scale
         prev_scale = self.value
-        self.proposal.loc.value = self.value
-        new_scale = self.proposal.sample()
-
-        # Calculate the target distribution log likelihood
-        prev_target_ll = pl.random.sics.logpdf(value=prev_scale,
-            dof=self.prior.dof.value, scale=self.prior.scale.value)
-        for x in xs:
-            prev_target_ll += pl.random.sics.logpdf(value=x,
-                scale=prev_scale, dof=dof)
-        new_target_ll = pl.random.sics.logpdf(value=new_scale,
-            dof=self.prior.dof.value, scale=self.prior.scale.value)
-        for x in xs:
-            new_target_ll += pl.random.sics.logpdf(value=x,
-                scale=new_scale, dof=dof)
-
-        # Normalize by the loglikelihood of the proposal
-        prev_prop_ll = pl.random.truncnormal.logpdf(
-            value=prev_scale, loc=new_scale, scale=proposal_std,
-            low=self.proposal.low, high=self.proposal.high)
-        new_prop_ll = pl.random.truncnormal.logpdf(
-            value=new_scale, loc=prev_scale, scale=proposal_std,
-            low=self.proposal.low, high=self.proposal.high)
-
-        # Accept or reject
-        r = (new_target_ll - prev_target_ll) + (prev_prop_ll - new_prop_ll)
-        u = np.log(pl.random.misc.fast_sample_standard_uniform())
-
-        if r >= u:
+        low, high = self._proposal_bounds
+        prior_dof, prior_scale = self._prior_params
+        new_scale = pl.random.misc.fast_sample_truncated_normal(float(prev_scale),
+            proposal_std, low, high)
+
+        # Accept or reject on the target distribution log likelihood,
+        # normalized by the loglikelihood of the proposal
+        u = -pl.random.misc.fast_sample_standard_exponential()
+        self.value, accepted = _qpcr_scale_mh_step(xs, dof=float(dof),
+            prev_scale=float(prev_scale), new_scale=float(new_scale),
+            prior_dof=prior_dof, prior_scale=prior_scale, proposal_std=proposal_std,
+            low=low, high=high, log_u=u)
+        if accepted:
             self.acceptances[self.sample_iter] = True
-            self.value = new_scale
             self.temp_acceptances += 1
-        else:
-            self.value = prev_scale
@@ -636,12 +636,15 @@ class ClusterPerturbationEffect(BasePerturbation, variables.Variable):
         np.ndarray((n_c,), dtype=float)
             Array of the cluster perturbation values for each cluster
         '''
-        ind = self.indicator.cluster_bool_array()
         if only_pos_ind:
-            val = self.magnitude.cluster_array()[ind]
-        else:
-            val = np.zeros(len(self.clustering))
-            val[ind] = self.magnitude.cluster_array()[ind]
+            # Read the magnitudes of the positive clusters straight from the dicts
+            ind = self.indicator.value
+            mag = self.magnitude.value
+            return np.asarray([mag[cid] for cid in self.clustering.order if ind[cid]],
+                dtype=self.magnitude.dtype)
+        ind = self.indicator.cluster_bool_array()
+        val = np.zeros(len(self.clustering))
+        val[ind] = self.magnitude.cluster_array()[ind]
         return val
     
     def add_trace(self):
@@ -1270,7 +1273,7 @@ class Interactions(ClusterProperty, Node, Traceable):
                 interaction.value = arr[idx]
                 idx += 1
 
-    def get_values(self, use_indicators: bool=True) -> np.ndarray:
+    def get_values(self, use_indicators: bool=True, out: np.ndarray=None) -> np.ndarray:
         '''Makes a vector of the interaction variables in the order of the
         clustering
 
@@ -1282,13 +1285,20 @@ class Interactions(ClusterProperty, Node, Traceable):
         use_indicators : bool, Optional
             If True, we only return the interactions with a positive indicator. Else we get every
             single interaction
+        out : np.ndarray, Optional
+            If specified, write the values into this array instead of allocating a new
+            one. It must be at least `self.size` long.
 
         Returns
         -------
         np.ndarray(n, dtype=float)
-            Array of the interaction values, in order
+            Array of the interaction values, in order. If `out` is specified this is a
+            view of `out`.
         '''
-        ret = np.zeros(self.size)
+        if out is None:
+            ret = np.zeros(self.size)
+        else:
+            ret = out
         idx = 0
         if use_indicators:
             for interaction in self.iter_valid():
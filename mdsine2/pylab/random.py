@@ -155,6 +155,14 @@ class misc:
         '''
         return C_SAMPLE.c_standard_uniform()
 
+    @staticmethod
+    def fast_sample_standard_exponential() -> float:
+        '''Sample from an exponential distribution with rate 1. This is
+        `-log(u)` of the same draw `u` that `fast_sample_standard_uniform` would make,
+        so MH steps can compare against `log(u)` without taking the log in Python
+        '''
+        return C_SAMPLE.c_exponential(1.)
+
     @staticmethod
     def fast_sample_normal(loc: float, scale: float) -> float:
         '''Sample from a c_implementation of a normal distribution.
@@ -171,6 +179,25 @@ class misc:
         '''
         return C_SAMPLE.c_normal(loc, scale)
 
+    @staticmethod
+    def fast_sample_truncated_normal(loc: float, scale: float, low: float,
+        high: float) -> float:
+        '''Sample from a c_implementation of a truncated normal distribution on
+        [low, high]. Only accepts floats
+
+        Parameters
+        ----------
+        loc, scale : float
+            Mean and standard devition, respectively
+        low, high : float
+            Truncation points of normal distribution
+
+        Returns
+        -------
+        float
+        '''
+        return C_SAMPLE.c_truncated_normal(loc, scale, low, high)
+
 
 class _BaseSample:
 